@@ -0,0 +1,307 @@
+"""
+Query-Plan-Analyse und Index-Vorschläge für die wichtigsten Queries der App.
+
+Die Queries werden in flask_app.py mit register_query() angemeldet.
+Für jede Query wird EXPLAIN FORMAT=JSON gegen das Live-Schema ausgeführt;
+Full-Table-Scans und Filesorts werden gemeldet. Die Spalten für den
+Index-Vorschlag kommen aus dem Plan (attached_condition der betroffenen
+Tabelle: erst Gleichheits-, dann Bereichs-Bedingungen) bzw. bei Filesorts
+zusätzlich aus dem ORDER BY der Query. Vorgeschlagen wird nur, wenn noch
+kein Index mit diesem linken Prefix existiert.
+
+    python advisor.py                    # Bericht ausgeben
+    python advisor.py --json             # Bericht als JSON
+    python advisor.py --write-migration  # Vorschläge als neue Migration ablegen
+                                         # (danach: python migrations.py upgrade)
+    python advisor.py --write-migration --accept idx_a,idx_b
+                                         # nur die akzeptierten Vorschläge
+"""
+import json
+import os
+import re
+import sys
+
+from db import get_conn
+
+# name -> (sql, beispiel-parameter)
+HOT_QUERIES = {}
+
+# Namen für bekannte Indexe (gleiche Spalten); sonst idx_<tabelle>_<spalten>
+INDEX_CANDIDATES = {
+    "todos": [("idx_todos_user_due", ["user_id", "due"])],
+    "behandelt": [("idx_behandelt_arzt", ["ärztenummer"])],
+    "nimmt": [("idx_nimmt_fachname", ["fachname"])],
+    "patient": [("idx_patient_bettnummer", ["bettnummer"])],
+}
+
+
+def register_query(name, sql, params=()):
+    HOT_QUERIES[name] = (sql, tuple(params))
+    return sql
+
+
+def _first_table(node):
+    # erster "table"-Knoten unterhalb von node (Tiefensuche)
+    if isinstance(node, dict):
+        if "table_name" in node:
+            return node
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _first_table(child)
+        if found:
+            return found
+    return None
+
+
+def _condition_columns(table):
+    """
+    Spalten dieser Tabelle in attached_condition, z.B.
+    "((`db`.`t`.`user_id` = 1) and (`db`.`t`.`due` > ...))" -> (["user_id"], ["due"])
+    """
+    alias = re.escape(table["table_name"])
+    equal, other = [], []
+    for column, op in re.findall(
+        rf"`[^`]+`\.`{alias}`\.`([^`]+)`\s*(<=>|=)?", table.get("attached_condition", "")
+    ):
+        if column not in equal and column not in other:
+            (equal if op else other).append(column)
+    return equal, other
+
+
+def _walk(node, findings):
+    # Sucht rekursiv nach "table"-Knoten und Filesort/Temp-Table-Markern
+    if isinstance(node, dict):
+        if node.get("using_filesort") or node.get("using_temporary_table"):
+            table = _first_table(node)
+            finding = {
+                "problem": "filesort" if node.get("using_filesort") else "temporary_table",
+                "table": table["table_name"] if table else None,
+            }
+            if table:
+                finding["equal"], _ = _condition_columns(table)
+            findings.append(finding)
+
+        table = node.get("table")
+        if isinstance(table, dict) and "table_name" in table:
+            if table.get("access_type") == "ALL":
+                equal, other = _condition_columns(table)
+                findings.append({
+                    "problem": "full_scan",
+                    "table": table["table_name"],
+                    "rows": table.get("rows_examined_per_scan"),
+                    "equal": equal,
+                    "range": other,
+                })
+        for value in node.values():
+            _walk(value, findings)
+    elif isinstance(node, list):
+        for value in node:
+            _walk(value, findings)
+
+
+def explain(cur, sql, params=()):
+    cur.execute("EXPLAIN FORMAT=JSON " + sql, params)
+    plan = json.loads(cur.fetchall()[0][0])
+    findings = []
+    _walk(plan, findings)
+    return plan, findings
+
+
+_KEYWORDS = {"ON", "WHERE", "LEFT", "RIGHT", "INNER", "JOIN", "ORDER", "GROUP", "LIMIT", "SET", "VALUES", "AS"}
+
+
+def _alias_tables(sql):
+    # "FROM nimmt n" / "JOIN patient p" -> {"n": "nimmt", "p": "patient"}
+    words = sql.replace("`", "").split()
+    aliases = {}
+    for i, word in enumerate(words[:-1]):
+        if word.upper() in ("FROM", "JOIN", "UPDATE", "INTO"):
+            table = words[i + 1].strip("(),")
+            aliases[table] = table
+            alias = words[i + 2] if i + 2 < len(words) else ""
+            if alias and alias.upper() not in _KEYWORDS and not alias.startswith("("):
+                aliases[alias.strip(",")] = table
+    return aliases
+
+
+_ORDER_BY_RE = re.compile(r"\bORDER\s+BY\s+(.+?)(?:\bLIMIT\b|$)", re.IGNORECASE | re.DOTALL)
+
+
+def _order_columns(sql, alias, aliases):
+    """Spalten aus ORDER BY, die zu alias gehören (ohne Prefix und ASC/DESC)."""
+    m = _ORDER_BY_RE.search(sql.replace("`", ""))
+    if not m:
+        return []
+    columns = []
+    for part in m.group(1).split(","):
+        expr = part.split()[0] if part.split() else ""
+        prefix, _, column = expr.rpartition(".")
+        # unqualifiziert zählt nur bei Queries mit einer einzigen Tabelle
+        if (prefix and prefix == alias) or (not prefix and len(set(aliases.values())) == 1):
+            columns.append(column)
+        else:
+            # ORDER BY über eine andere Tabelle -> kein Index auf alias hilft
+            return []
+    return columns
+
+
+def index_columns(sql, finding, aliases):
+    """Spalten für einen Index, der das Problem beheben kann ([] = keiner)."""
+    equal = finding.get("equal", [])
+    if finding["problem"] == "full_scan":
+        return equal + finding.get("range", [])[:1]
+    if finding["problem"] == "filesort":
+        order = _order_columns(sql, finding["table"], aliases)
+        return equal + [c for c in order if c not in equal] if order else []
+    return []
+
+
+def _index_name(table, columns):
+    for name, candidate in INDEX_CANDIDATES.get(table, []):
+        if candidate == columns:
+            return name
+    return f"idx_{table}_{'_'.join(columns)}"[:64]
+
+
+def existing_indexes(cur, table):
+    """{indexname: [spalten in Reihenfolge]}"""
+    cur.execute("""
+        SELECT index_name, column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for index_name, column_name in cur.fetchall():
+        indexes.setdefault(index_name, []).append(column_name)
+    return indexes
+
+
+def _covered(columns, indexes):
+    # Ein Index deckt ab, wenn die Spalten sein linkester Prefix sind
+    return any(cols[:len(columns)] == columns for cols in indexes.values())
+
+
+def analyze():
+    """Liefert {"queries": {...}, "proposals": [...]}."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        report = {}
+        # (tabelle, spalten) -> Queries, die davon profitieren
+        wanted = {}
+
+        for name, (sql, params) in HOT_QUERIES.items():
+            try:
+                _, findings = explain(cur, sql, params)
+            except Exception as e:
+                report[name] = {"error": str(e)}
+                continue
+
+            aliases = _alias_tables(sql)
+            for finding in findings:
+                if not finding["table"]:
+                    continue
+                columns = index_columns(sql, finding, aliases)
+                finding["table"] = aliases.get(finding["table"], finding["table"])
+                if columns:
+                    wanted.setdefault((finding["table"], tuple(columns)), []).append(name)
+            report[name] = {"findings": findings}
+
+        proposals = []
+        indexes = {}
+        for (table, columns), queries in sorted(wanted.items()):
+            columns = list(columns)
+            if table not in indexes:
+                indexes[table] = existing_indexes(cur, table)
+            # schon vorhanden oder linker Prefix eines anderen Vorschlags
+            others = [list(c) for t, c in wanted if t == table and list(c) != columns]
+            if _covered(columns, indexes[table]) or any(c[:len(columns)] == columns for c in others):
+                continue
+            index_name = _index_name(table, columns)
+            cols = ", ".join(f"`{c}`" for c in columns)
+            proposals.append({
+                "table": table,
+                "name": index_name,
+                "columns": columns,
+                "queries": queries,
+                "ddl": f"CREATE INDEX `{index_name}` ON `{table}` ({cols})",
+            })
+
+        return {"queries": report, "proposals": proposals}
+    finally:
+        conn.close()
+
+
+def write_migration(proposals):
+    """Legt die Vorschläge als nächste Migration in db/migrations/ ab."""
+    import migrations
+
+    number = migrations.latest_version() + 1
+    path = os.path.join(migrations.MIGRATIONS_DIR, f"{number:04d}_advisor_indexes.py")
+    lines = [
+        "# Vom Index-Advisor vorgeschlagene Indexe (python advisor.py --write-migration)",
+        "from migrations import ensure_index",
+        "",
+        "INDEXES = [",
+    ]
+    for p in proposals:
+        lines.append(f"    ({p['table']!r}, {p['name']!r}, {p['ddl']!r}),")
+    lines += [
+        "]",
+        "",
+        "",
+        "def upgrade(cur):",
+        "    for table, name, ddl in INDEXES:",
+        "        ensure_index(cur, table, name, ddl)",
+        "",
+    ]
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("\n".join(lines))
+    return path
+
+
+def main(argv):
+    # registriert die Queries
+    import flask_app  # noqa: F401
+
+    result = analyze()
+
+    if "--json" in argv:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        for name, entry in result["queries"].items():
+            if "error" in entry:
+                print(f"{name}: FEHLER {entry['error']}")
+            elif entry["findings"]:
+                problems = ", ".join(
+                    f"{f['problem']}({f['table']})" if f["table"] else f["problem"]
+                    for f in entry["findings"]
+                )
+                print(f"{name}: {problems}")
+            else:
+                print(f"{name}: ok")
+
+        print()
+        for p in result["proposals"]:
+            print(f"{p['ddl']};  -- {', '.join(p['queries'])}")
+        if not result["proposals"]:
+            print("Keine Index-Vorschläge.")
+
+    if "--write-migration" in argv:
+        proposals = result["proposals"]
+        if "--accept" in argv:
+            accepted = set(argv[argv.index("--accept") + 1].split(","))
+            proposals = [p for p in proposals if p["name"] in accepted]
+        if proposals:
+            print(f"Migration geschrieben: {write_migration(proposals)}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
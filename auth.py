@@ -1,7 +1,13 @@
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 from flask_login import LoginManager, UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from mysql.connector import errors
 from db import db_read, db_write
+from hashing import hash_password, verify_password
+import metrics
 
 # Logger für dieses Modul
 logger = logging.getLogger(__name__)
@@ -56,17 +62,90 @@ class User(UserMixin):
             return None
 
 
+# User-Cache für load_user (LRU + TTL), damit nicht jeder Request
+# ein SELECT auf users macht. Nicht gefundene User werden NICHT gecacht.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+USER_CACHE_STATS = {"hits": 0, "misses": 0, "invalidations": 0}
+_user_cache = OrderedDict()   # user_id -> (expires_at, User)
+_user_cache_lock = threading.Lock()
+
+
+def _cache_get(user_id):
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry and entry[0] > now:
+            _user_cache.move_to_end(user_id)
+            USER_CACHE_STATS["hits"] += 1
+            return entry[1]
+        if entry:
+            del _user_cache[user_id]
+        USER_CACHE_STATS["misses"] += 1
+        return None
+
+
+def _cache_put(user):
+    with _user_cache_lock:
+        _user_cache[user.id] = (time.monotonic() + USER_CACHE_TTL, user)
+        _user_cache.move_to_end(user.id)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+
+def invalidate_user(user_id=None, username=None):
+    """Entfernt einen User (per id oder username) aus dem Cache."""
+    with _user_cache_lock:
+        if user_id is not None:
+            _user_cache.pop(user_id, None)
+        if username is not None:
+            for uid, (_, user) in list(_user_cache.items()):
+                if user.username == username:
+                    del _user_cache[uid]
+        USER_CACHE_STATS["invalidations"] += 1
+
+
+def clear_user_cache():
+    with _user_cache_lock:
+        _user_cache.clear()
+        USER_CACHE_STATS["invalidations"] += 1
+
+
+def user_cache_stats():
+    with _user_cache_lock:
+        stats = dict(USER_CACHE_STATS)
+        stats["size"] = len(_user_cache)
+    return stats
+
+
+def _user_cache_collector():
+    stats = user_cache_stats()
+    yield "user_cache_hits_total", "counter", "load_user aus dem Cache", stats["hits"]
+    yield "user_cache_misses_total", "counter", "load_user mit DB-Zugriff", stats["misses"]
+    yield "user_cache_invalidations_total", "counter", "Invalidierungen", stats["invalidations"]
+    yield "user_cache_size", "gauge", "Gecachte User", stats["size"]
+
+metrics.register_collector(_user_cache_collector)
+
+
 # Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
     logger.debug("load_user() aufgerufen mit user_id=%s", user_id)
     try:
-        user = User.get_by_id(int(user_id))
+        user_id = int(user_id)
     except ValueError:
         logger.error("load_user(): user_id=%r ist keine int", user_id)
         return None
 
+    user = _cache_get(user_id)
+    if user:
+        return user
+
+    user = User.get_by_id(user_id)
     if user:
+        _cache_put(user)
         logger.debug("load_user(): User gefunden: %s (id=%s)", user.username, user.id)
     else:
         logger.warning("load_user(): kein User für id=%s gefunden", user_id)
@@ -75,21 +154,25 @@ def load_user(user_id):
 
 
 # Helpers
+# Beide können hashing.HashingBusy werfen (Hash-Pool ausgelastet).
 def register_user(username, password):
     logger.info("register_user(): versuche neuen User '%s' anzulegen", username)
 
-    existing = User.get_by_username(username)
-    if existing:
-        logger.warning("register_user(): Username '%s' existiert bereits", username)
-        return False
-
-    hashed = generate_password_hash(password)
+    hashed = hash_password(password)
     try:
+        # users.username ist UNIQUE -> kein SELECT vorher nötig
         db_write(
             "INSERT INTO users (username, password) VALUES (%s, %s)",
             (username, hashed)
         )
+        invalidate_user(username=username)
         logger.info("register_user(): User '%s' erfolgreich angelegt", username)
+    except errors.IntegrityError as e:
+        if e.errno != 1062:  # ER_DUP_ENTRY
+            logger.exception("Fehler beim Anlegen von User '%s'", username)
+        else:
+            logger.warning("register_user(): Username '%s' existiert bereits", username)
+        return False
     except Exception:
         logger.exception("Fehler beim Anlegen von User '%s'", username)
         return False
@@ -97,6 +180,20 @@ def register_user(username, password):
     return True
 
 
+def _rehash(user, new_hash):
+    # nur ersetzen, wenn inzwischen niemand sonst das Passwort geändert hat
+    try:
+        db_write(
+            "UPDATE users SET password = %s WHERE id = %s AND password = %s",
+            (new_hash, user.id, user.password)
+        )
+        invalidate_user(user_id=user.id)
+        user.password = new_hash
+        logger.info("authenticate(): Passwort-Hash für '%s' aktualisiert", user.username)
+    except Exception:
+        logger.exception("Rehash für User '%s' fehlgeschlagen", user.username)
+
+
 def authenticate(username, password):
     logger.info("authenticate(): Login-Versuch für '%s'", username)
     user = User.get_by_username(username)
@@ -105,9 +202,12 @@ def authenticate(username, password):
         logger.warning("authenticate(): kein User mit username='%s' gefunden", username)
         return None
 
-    if check_password_hash(user.password, password):
+    ok, new_hash = verify_password(user.password, password)
+    if ok:
         logger.info("authenticate(): Passwort korrekt für '%s'", username)
+        if new_hash:
+            _rehash(user, new_hash)
         return user
 
     logger.warning("authenticate(): falsches Passwort für '%s'", username)
-    return None
\ No newline at end of file
+    return None
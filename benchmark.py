@@ -0,0 +1,331 @@
+"""
+Reproduzierbarer Lasttest für die Flask-Routen.
+
+Startet flask_app.app im selben Prozess (Flask-Test-Client, ein Client pro
+Thread) gegen die DB aus dem .env und spielt einen gewichteten Mix aus
+Login, Todo-Liste, Medikament-POSTs, Listen-Seiten, DB-Explorer-Suchen und
+/db_viz/data ab. Gemessen werden p50/p95/p99, Requests pro Sekunde,
+Wartezeit auf den Pool und Queries pro Request. Antworten mit Status
+ausserhalb 2xx/3xx zählen als Fehler und gehen nicht in die Zeiten ein.
+
+    python benchmark.py                                  # 4 Threads, 30 s, Mix "default"
+    python benchmark.py -c 16 -d 60 --mix read           # nur lesende Routen
+    python benchmark.py -o bench_results.json            # Ergebnis als JSON
+    python benchmark.py --compare alt.json neu.json      # Regression prüfen (Exit-Code 1)
+
+Lokale DB statt PythonAnywhere:
+
+    docker run -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=bench -e MYSQL_DATABASE=bench mysql:8
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=bench DB_DATABASE=bench python migrations.py upgrade
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=bench DB_DATABASE=bench python benchmark.py
+"""
+import argparse
+import contextvars
+import json
+import logging
+import platform
+import random
+import sys
+import threading
+import time
+
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench-password"
+# Medikament-POSTs legen Medikamente mit diesem Prefix an (werden am Ende gelöscht)
+BENCH_PREFIX = "bench-"
+
+LIST_PAGES = ["/patient", "/arzt", "/medizin", "/nimmt", "/behandelt", "/aufenthalt", "/users"]
+SEARCH_TERMS = ["Müller", "Grippe", "AOK", "Ibuprofen", "Schmidt", "Fieber"]
+
+_counter = [0]
+_counter_lock = threading.Lock()
+
+
+def _next_id():
+    with _counter_lock:
+        _counter[0] += 1
+        return _counter[0]
+
+
+# -------- Szenarien: fn(client, rng) -> (name, response) --------
+
+def login(client, rng):
+    return "login", client.post("/login", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+
+
+def todo_list(client, rng):
+    return "index", client.get("/")
+
+
+def list_page(client, rng):
+    path = rng.choice(LIST_PAGES)
+    return path, client.get(path)
+
+
+def medizin_post(client, rng):
+    # antwortet mit Redirect (302) auf den DB Explorer
+    return "medizin_new", client.post("/medizin/new", data={
+        "fachname": f"{BENCH_PREFIX}{time.time_ns()}-{_next_id()}",
+        "dosierung": "1x täglich",
+    })
+
+
+def dbexplorer_search(client, rng):
+    return "dbexplorer_search", client.post("/dbexplorer", data={
+        "table": "patient",
+        "limit": "50",
+        "search_column": rng.choice(["name", "krankheiten", "krankenkasse"]),
+        "search_value": rng.choice(SEARCH_TERMS),
+    })
+
+
+def db_viz(client, rng):
+    return "db_viz_data", client.get("/db_viz/data")
+
+
+# (gewicht, szenario)
+MIXES = {
+    "default": [
+        (2, login),
+        (15, todo_list),
+        (45, list_page),
+        (10, medizin_post),
+        (18, dbexplorer_search),
+        (10, db_viz),
+    ],
+    "read": [
+        (20, todo_list),
+        (55, list_page),
+        (15, dbexplorer_search),
+        (10, db_viz),
+    ],
+    "write": [
+        (70, medizin_post),
+        (30, list_page),
+    ],
+}
+
+
+# -------- Messung --------
+
+# Liste pro Request: ein Eintrag pro Query. Der Test-Client führt den
+# Request im aufrufenden Thread aus, db.read_many reicht den Kontext an
+# seine Worker-Threads weiter (append ist threadsicher).
+_request_queries = contextvars.ContextVar("bench_request_queries", default=None)
+
+
+def _count_query(kind, sql, seconds, rows, error):
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.append(kind)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # name -> {"latencies": [...], "errors": n, "queries": n}
+        # (latencies/queries nur von erfolgreichen Requests)
+        self.routes = {}
+
+    def add(self, name, seconds, ok, queries):
+        with self.lock:
+            route = self.routes.setdefault(name, {"latencies": [], "errors": 0, "queries": 0})
+            if ok:
+                route["latencies"].append(seconds)
+                route["queries"] += queries
+            else:
+                route["errors"] += 1
+
+
+def _summary(latencies, errors, queries, elapsed):
+    values = sorted(latencies)
+    count = len(values)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "count": count,
+        "errors": errors,
+        "rps": round(count / elapsed, 2) if elapsed else None,
+        "mean_ms": ms(sum(values) / count) if count else None,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else None,
+        "queries_per_request": round(queries / count, 2) if count else None,
+    }
+
+
+def _worker(app, mix, seed, stop_at, record_from, recorder):
+    rng = random.Random(seed)
+    weights = [w for w, _ in mix]
+    scenarios = [s for _, s in mix]
+
+    client = app.test_client()
+    login(client, rng)
+
+    while time.monotonic() < stop_at:
+        scenario = rng.choices(scenarios, weights)[0]
+        queries = []
+        _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            name, resp = scenario(client, rng)
+            resp.get_data()
+            ok = 200 <= resp.status_code < 400
+        except Exception:
+            name, ok = scenario.__name__, False
+        seconds = time.perf_counter() - started
+        if started >= record_from:
+            recorder.add(name, seconds, ok, len(queries))
+
+
+def _prepare():
+    # Benchmark-User anlegen (existiert er schon, passiert nichts)
+    from auth import register_user
+    register_user(BENCH_USER, BENCH_PASSWORD)
+
+
+def _cleanup():
+    from db import db_write
+    db_write("DELETE FROM medizin WHERE fachname LIKE %s", (BENCH_PREFIX + "%",))
+
+
+def run(concurrency=4, duration=30.0, warmup=2.0, mix="default", seed=1):
+    import db
+    import metrics
+    from flask_app import app
+
+    # Das Debug-Logging der App würde die Messung verfälschen
+    logging.getLogger().setLevel(logging.WARNING)
+    _prepare()
+    metrics.add_query_hook(_count_query)
+
+    recorder = Recorder()
+    start = time.monotonic()
+    record_from = time.perf_counter() + warmup
+    stop_at = start + warmup + duration
+
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(app, MIXES[mix], seed + i, stop_at, record_from, recorder),
+            daemon=True,
+        )
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    # Pool-Statistik erst nach dem Warmup festhalten
+    time.sleep(warmup)
+    pool_before = db.pool_stats()
+    measured_from = time.monotonic()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - measured_from
+    pool_after = db.pool_stats()
+
+    _cleanup()
+
+    routes = {}
+    all_latencies, all_errors, all_queries = [], 0, 0
+    for name, route in sorted(recorder.routes.items()):
+        routes[name] = _summary(route["latencies"], route["errors"], route["queries"], elapsed)
+        all_latencies += route["latencies"]
+        all_errors += route["errors"]
+        all_queries += route["queries"]
+
+    checkouts = pool_after["checkouts"] - pool_before["checkouts"]
+    wait_time = pool_after["wait_time"] - pool_before["wait_time"]
+    return {
+        "meta": {
+            "mix": mix,
+            "concurrency": concurrency,
+            "duration_s": round(elapsed, 3),
+            "warmup_s": warmup,
+            "seed": seed,
+            "pool_size": db.POOL_SIZE,
+            "python": platform.python_version(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "total": _summary(all_latencies, all_errors, all_queries, elapsed),
+        "routes": routes,
+        "pool": {
+            "checkouts": checkouts,
+            "waits": pool_after["waits"] - pool_before["waits"],
+            "timeouts": pool_after["timeouts"] - pool_before["timeouts"],
+            "wait_time_s": round(wait_time, 4),
+            "mean_wait_ms": round(wait_time / checkouts * 1000, 3) if checkouts else 0.0,
+        },
+    }
+
+
+def print_report(result):
+    meta, total, pool = result["meta"], result["total"], result["pool"]
+    print(f"Mix {meta['mix']}, {meta['concurrency']} Threads, {meta['duration_s']} s, Pool {meta['pool_size']}")
+    print(f"{'route':<22}{'n':>7}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}")
+    for name, r in list(result["routes"].items()) + [("TOTAL", total)]:
+        print(
+            f"{name:<22}{r['count']:>7}{r['errors']:>6}{r['rps']:>9}"
+            f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['queries_per_request']:>7}"
+        )
+    print(
+        f"Pool: {pool['checkouts']} Checkouts, {pool['waits']} mussten warten, "
+        f"{pool['timeouts']} Timeouts, Ø Wartezeit {pool['mean_wait_ms']} ms"
+    )
+
+
+def compare(base, new, threshold=10.0):
+    """Vergleicht p95 pro Route; liefert die Routen, die um mehr als threshold % langsamer sind."""
+    regressions = []
+    for name, r in new["routes"].items():
+        old = base["routes"].get(name)
+        if not old or not old["p95_ms"] or r["p95_ms"] is None:
+            continue
+        change = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        print(f"{name:<22} p95 {old['p95_ms']:>9} -> {r['p95_ms']:>9} ms ({change:+.1f} %)")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Lasttest für die Flask-Routen")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("-d", "--duration", type=float, default=30.0, help="Sekunden (ohne Warmup)")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="Ergebnis als JSON in diese Datei schreiben")
+    parser.add_argument("--compare", nargs=2, metavar=("ALT", "NEU"))
+    parser.add_argument("--threshold", type=float, default=10.0, help="erlaubte p95-Verschlechterung in %%")
+    args = parser.parse_args(argv[1:])
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as fh:
+            base = json.load(fh)
+        with open(args.compare[1], encoding="utf-8") as fh:
+            new = json.load(fh)
+        regressions = compare(base, new, args.threshold)
+        if regressions:
+            print(f"Langsamer als {args.threshold} %: {', '.join(regressions)}")
+            return 1
+        return 0
+
+    result = run(args.concurrency, args.duration, args.warmup, args.mix, args.seed)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2, ensure_ascii=False)
+        print(f"Ergebnis geschrieben: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
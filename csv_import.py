@@ -0,0 +1,324 @@
+"""
+CSV-Import für patient, arzt, medizin, aktuellerAufenthalt, nimmt, behandelt.
+
+Die Datei wird zeilenweise gelesen (konstanter Speicher), jede Zeile mit
+denselben Umwandlungen wie in den Formularen geprüft und in Chunks à
+IMPORT_CHUNK_SIZE Zeilen per executemany eingefügt, ein Chunk = eine
+Transaktion. Schlägt ein Chunk fehl (doppelter Schlüssel, unbekannter
+Patient ...), wird er zeilenweise wiederholt: die übrigen Zeilen landen in
+der DB, die fehlerhaften im Bericht.
+
+Mit Job-Namen wird der Fortschritt in import_lauf in derselben Transaktion
+wie der Chunk gespeichert; derselbe Aufruf nach einem Abbruch macht beim
+ersten nicht committeten Chunk weiter.
+
+    python csv_import.py patient patienten.csv
+    python csv_import.py behandelt behandelt.csv --job onboarding-behandelt
+    python csv_import.py --status onboarding-behandelt
+
+Spaltennamen wie in der DB oder wie in den Formularen (aerztenummer,
+ehemalige_aufenthalte ...), Trennzeichen Komma, Kodierung UTF-8.
+"""
+import argparse
+import csv
+import datetime
+import io
+import logging
+import os
+import sys
+
+from mysql.connector import errors
+
+import ward_stats
+from db import db_read, transaction
+from patient_history import write_history_many
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# so viele Fehlerzeilen kommen einzeln in den Bericht (gezählt werden alle)
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+
+def _int_or_none(value):
+    return int(value) if value else None
+
+
+def _date(value):
+    # Format wie im Formular: YYYY-MM-DD
+    return datetime.date.fromisoformat(value) if value else None
+
+
+# tabelle -> [(spalte, formularname, umwandlung, pflicht)]
+IMPORTS = {
+    "patient": [
+        ("patientennummer", "patientennummer", int, True),
+        ("alter", "alter", _int_or_none, False),
+        ("name", "name", str, True),
+        ("krankenkasse", "krankenkasse", str, False),
+        ("krankheiten", "krankheiten", str, False),
+        ("ehemalige aufenthalte", "ehemalige_aufenthalte", str, False),
+        ("ehemalige medikamente", "ehemalige_medikamente", str, False),
+        ("bettnummer", "bettnummer", lambda v: int(v or 0), False),
+    ],
+    "arzt": [
+        ("ärztenummer", "aerztenummer", int, True),
+        ("name", "name", str, True),
+        ("spezialisierung", "spezialisierung", str, False),
+        ("anstellzeit", "anstellzeit", _int_or_none, False),
+    ],
+    "medizin": [
+        ("fachname", "fachname", str, True),
+        ("dosierung", "dosierung", str, False),
+    ],
+    "aktuellerAufenthalt": [
+        ("bettnummer", "bettnummer", int, True),
+        ("pflegebedarf", "pflegebedarf", str, False),
+        ("anfangsdatum", "anfangsdatum", _date, False),
+    ],
+    "nimmt": [
+        ("patientennummer", "patientennummer", int, True),
+        ("fachname", "fachname", str, True),
+    ],
+    "behandelt": [
+        ("patientennummer", "patientennummer", int, True),
+        ("ärztenummer", "aerztenummer", int, True),
+    ],
+}
+
+# Fehler einzelner Zeilen (Schlüssel doppelt, Foreign Key, Wert zu lang)
+ROW_ERRORS = (errors.IntegrityError, errors.DataError)
+
+
+class CsvImportError(Exception):
+    """Datei passt nicht zur Tabelle (z.B. Pflichtspalte fehlt)."""
+
+
+def insert_sql(table):
+    columns = [column for column, _, _, _ in IMPORTS[table]]
+    return (
+        f"INSERT INTO `{table}` (" + ", ".join(f"`{c}`" for c in columns) + ") "
+        f"VALUES (" + ", ".join(["%s"] * len(columns)) + ")"
+    )
+
+
+def _coerce(spec, row):
+    values = []
+    for column, form_name, convert, required in spec:
+        raw = row.get(form_name)
+        if raw is None:
+            raw = row.get(column)
+        raw = (raw or "").strip()
+        if required and not raw:
+            raise ValueError(f"{column} fehlt")
+        try:
+            values.append(convert(raw))
+        except ValueError:
+            raise ValueError(f"{column}: ungültiger Wert {raw!r}")
+    return tuple(values)
+
+
+def _after_insert(tx, table, rows):
+    # Vorgeschichte und Stations-Statistik wie bei den new_*-Routen
+    if not rows:
+        return
+    if table == "patient":
+        write_history_many(tx, [(r[0], r[5], r[6]) for r in rows])
+        ward_stats.patient_added(tx, len(rows))
+    elif table == "aktuellerAufenthalt":
+        ward_stats.aufenthalte_added(tx, [(r[1], r[2]) for r in rows])
+    elif table == "behandelt":
+        per_arzt = {}
+        for _, aerztenummer in rows:
+            per_arzt[aerztenummer] = per_arzt.get(aerztenummer, 0) + 1
+        for aerztenummer, count in per_arzt.items():
+            ward_stats.behandelt_added(tx, aerztenummer, count)
+
+
+def _save_progress(tx, job, table, position, inserted, failed):
+    tx.write("INSERT IGNORE INTO import_lauf (name, tabelle) VALUES (%s, %s)", (job, table))
+    tx.write(
+        "UPDATE import_lauf SET zeilen = %s, eingefuegt = eingefuegt + %s, fehler = fehler + %s "
+        "WHERE name = %s",
+        (position, inserted, failed, job)
+    )
+
+
+def progress(job):
+    """Gespeicherter Stand eines Jobs (dict) oder None."""
+    return db_read(
+        "SELECT name, tabelle, zeilen, eingefuegt, fehler FROM import_lauf WHERE name = %s",
+        (job,), single=True, primary=True
+    )
+
+
+class Report:
+    def __init__(self, table, job):
+        self.table = table
+        self.job = job
+        self.resumed_at = 0
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        # Fehler, die schon in import_lauf gezählt sind
+        self.failed_saved = 0
+        self.chunks = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"zeile": line, "fehler": message})
+
+    def as_dict(self):
+        return {
+            "table": self.table,
+            "job": self.job,
+            "resumed_at": self.resumed_at,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "errors": self.errors,
+        }
+
+
+def _flush(table, chunk, position, report, job):
+    sql = insert_sql(table)
+    rows = [values for _, values in chunk]
+    try:
+        with transaction() as tx:
+            if rows:
+                tx.write_many(sql, rows)
+            _after_insert(tx, table, rows)
+            if job:
+                _save_progress(tx, job, table, position, len(rows), report.failed - report.failed_saved)
+        inserted = rows
+    except ROW_ERRORS:
+        # zeilenweise wiederholen; ein fehlgeschlagenes INSERT nimmt nur
+        # sich selbst zurück, nicht die Transaktion
+        inserted = []
+        with transaction() as tx:
+            for line, values in chunk:
+                try:
+                    tx.write(sql, values)
+                except ROW_ERRORS as e:
+                    report.error(line, getattr(e, "msg", None) or str(e))
+                else:
+                    inserted.append(values)
+            _after_insert(tx, table, inserted)
+            if job:
+                _save_progress(tx, job, table, position, len(inserted), report.failed - report.failed_saved)
+
+    report.failed_saved = report.failed
+    report.inserted += len(inserted)
+    report.chunks += 1
+
+
+def import_csv(table, fh, job=None, chunk_size=IMPORT_CHUNK_SIZE, on_chunk=None):
+    """
+    Importiert eine CSV-Datei (Text-Stream) in table. Liefert einen Report;
+    on_chunk(report) wird nach jedem committeten Chunk aufgerufen.
+    """
+    if table not in IMPORTS:
+        raise CsvImportError(f"Unbekannte Tabelle: {table}")
+    spec = IMPORTS[table]
+    report = Report(table, job)
+
+    reader = csv.DictReader(fh)
+    header = set(reader.fieldnames or ())
+    missing = [
+        column for column, form_name, _, required in spec
+        if required and column not in header and form_name not in header
+    ]
+    if missing:
+        raise CsvImportError(f"Spalten fehlen: {', '.join(missing)}")
+
+    if job:
+        done = progress(job)
+        if done and done["tabelle"] != table:
+            raise CsvImportError(f"Job {job} gehört zu Tabelle {done['tabelle']}")
+        report.resumed_at = done["zeilen"] if done else 0
+
+    # position = Anzahl Datenzeilen bis zum Ende des letzten Chunks
+    position = report.resumed_at
+    chunk = []
+    for index, row in enumerate(reader):
+        # bereits committete Chunks eines früheren Laufs überspringen
+        if index < position:
+            continue
+        report.rows += 1
+        try:
+            chunk.append((reader.line_num, _coerce(spec, row)))
+        except ValueError as e:
+            report.error(reader.line_num, str(e))
+
+        if index + 1 - position >= chunk_size:
+            position = index + 1
+            _flush(table, chunk, position, report, job)
+            if on_chunk:
+                on_chunk(report)
+            chunk = []
+
+    if report.resumed_at + report.rows > position:
+        _flush(table, chunk, report.resumed_at + report.rows, report, job)
+        if on_chunk:
+            on_chunk(report)
+
+    logger.info(
+        "CSV-Import %s: %d Zeilen, %d eingefügt, %d Fehler",
+        table, report.rows, report.inserted, report.failed
+    )
+    return report
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="CSV-Import in die Stationsdatenbank")
+    parser.add_argument("table", nargs="?", choices=sorted(IMPORTS))
+    parser.add_argument("file", nargs="?", help="CSV-Datei ('-' = stdin)")
+    parser.add_argument("--job", help="Job-Name: Fortschritt speichern und bei erneutem Aufruf fortsetzen")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--status", metavar="JOB", help="gespeicherten Stand eines Jobs anzeigen")
+    args = parser.parse_args(argv[1:])
+
+    if args.status:
+        done = progress(args.status)
+        if not done:
+            print(f"Job {args.status} unbekannt.")
+            return 1
+        print(f"{done['name']} ({done['tabelle']}): {done['zeilen']} Zeilen committet, "
+              f"{done['eingefuegt']} eingefügt, {done['fehler']} Fehler")
+        return 0
+
+    if not args.table or not args.file:
+        parser.print_usage()
+        return 1
+
+    def show(report):
+        print(f"\r{report.resumed_at + report.rows} Zeilen, {report.inserted} eingefügt, "
+              f"{report.failed} Fehler", end="", flush=True)
+
+    if args.file == "-":
+        fh = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    else:
+        fh = open(args.file, encoding="utf-8-sig", newline="")
+    try:
+        report = import_csv(args.table, fh, args.job, args.chunk_size, on_chunk=show)
+    except CsvImportError as e:
+        print(e)
+        return 1
+    finally:
+        fh.close()
+    print()
+
+    if report.resumed_at:
+        print(f"Fortgesetzt ab Datenzeile {report.resumed_at + 1}.")
+    for error in report.errors:
+        print(f"Zeile {error['zeile']}: {error['fehler']}")
+    if report.failed > len(report.errors):
+        print(f"... und {report.failed - len(report.errors)} weitere Fehler")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,9 +1,24 @@
 from dotenv import load_dotenv
 import os
-from mysql.connector import pooling
+import base64
+import binascii
+import contextvars
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from mysql.connector import errors, pooling
+import metrics
 
 # Load .env variables
 load_dotenv()
+
+# "mysql" (Standard) oder "sqlite" (eingebettet, ohne Server; siehe sqlite_backend.py)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+
 DB_CONFIG = {
     "host": os.getenv("DB_HOST"),
     "user": os.getenv("DB_USER"),
@@ -11,216 +26,909 @@ DB_CONFIG = {
     "database": os.getenv("DB_DATABASE")
 }
 
+# Pool-Einstellungen (alle per ENV überschreibbar)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# max. Wartezeit in Sekunden, wenn alle Connections belegt sind
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Einen eigenen Health-Check braucht es nicht: get_connection() des
+# mysql-connector-Pools pingt selbst und verbindet tote Connections neu.
+
+# Server-side Prepared Statements: pro Connection ein LRU-Cache von
+# vorbereiteten Cursorn (Key = SQL-Text). Wiederholte Statements werden
+# nicht neu geparst und laufen über das Binärprotokoll.
+# Standardmässig aus: mysql-connector schickt vor jedem Execute ein
+# COM_STMT_RESET und wartet auf die Antwort -> zwei Round-Trips pro Query.
+# Lohnt sich nur bei DB-Server mit kurzer Latenz; vorher mit benchmark.py
+# (--compare) nachmessen.
+# (Bei SQLite unnötig: sqlite3 cached vorbereitete Statements selbst.)
+PREPARED_STATEMENTS = DB_BACKEND == "mysql" and os.getenv("DB_PREPARED_STATEMENTS", "0") == "1"
+STMT_CACHE_SIZE = int(os.getenv("DB_STMT_CACHE_SIZE", "64"))
+
+# Optionales Read-Replica: DB_REPLICA_HOST (+ optional PORT/USER/PASSWORD/DATABASE,
+# sonst wie beim Primary). db_read geht dann standardmässig aufs Replica.
+REPLICA_CONFIG = {
+    "host": os.getenv("DB_REPLICA_HOST"),
+    "user": os.getenv("DB_REPLICA_USER") or DB_CONFIG["user"],
+    "password": os.getenv("DB_REPLICA_PASSWORD") or DB_CONFIG["password"],
+    "database": os.getenv("DB_REPLICA_DATABASE") or DB_CONFIG["database"]
+}
+if os.getenv("DB_REPLICA_PORT"):
+    REPLICA_CONFIG["port"] = int(os.getenv("DB_REPLICA_PORT"))
+# Nach einem Write liest dieselbe Session so lange vom Primary (Sekunden)
+READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
+
+_stats_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    MySQLConnectionPool mit begrenzter Warteschlange (statt sofort PoolError)
+    und Zählern für Monitoring.
+    """
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "broken": 0,
+        }
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(POOL_SIZE)
+        # ausgecheckte Connections (unter _stats_lock)
+        self._in_use = 0
+        # conn_key -> connection_id beim letzten Checkout
+        self._sessions = {}
+
+    def _count(self, key, value=1):
+        with _stats_lock:
+            self.stats[key] += value
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Check: ENV wirklich gesetzt?
+            missing = [k for k, v in self.config.items() if not v]
+            if missing:
+                raise RuntimeError(f"Missing DB env vars: {missing}")
+
+            self._pool = pooling.MySQLConnectionPool(
+                pool_name=self.name,
+                pool_size=POOL_SIZE,
+                # ein Session-Reset würde die Prepared Statements verwerfen
+                pool_reset_session=not PREPARED_STATEMENTS,
+                **self.config
+            )
+        return self._pool
+
+    def _check_reconnect(self, conn):
+        # neue connection_id = der Pool hat eine tote Connection
+        # (wait_timeout, Server-Neustart) still neu verbunden
+        key = _conn_key(conn)
+        previous = self._sessions.get(key)
+        self._sessions[key] = conn.connection_id
+        if previous is not None and previous != self._sessions[key]:
+            self._count("broken")
+
+    def get_conn(self):
+        pool = self._get_pool()
+        checkout_started = time.perf_counter()
+
+        # Freien Platz holen, sonst begrenzt warten (statt sofort PoolError)
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            started = time.monotonic()
+            ok = self._slots.acquire(timeout=POOL_TIMEOUT)
+            self._count("wait_time", time.monotonic() - started)
+            if not ok:
+                self._count("timeouts")
+                raise errors.PoolError(
+                    f"Keine DB-Connection frei nach {POOL_TIMEOUT}s "
+                    f"(pool={self.name}, pool_size={POOL_SIZE})"
+                )
+
+        try:
+            conn = pool.get_connection()
+            self._check_reconnect(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with _stats_lock:
+            self.stats["checkouts"] += 1
+            self._in_use += 1
+        metrics.observe_conn_wait(time.perf_counter() - checkout_started)
+        return PooledConn(conn, self)
+
+    def release(self, conn):
+        with _stats_lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def snapshot(self):
+        with _stats_lock:
+            stats = dict(self.stats)
+            stats["in_use"] = self._in_use
+        stats["size"] = POOL_SIZE
+        return stats
+
+
+class PooledConn:
+    """
+    Dünner Wrapper um die Pool-Connection: close() gibt zusätzlich den
+    Platz in der Warteschlange frei. Alles andere wird durchgereicht.
+    """
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        try:
+            if PREPARED_STATEMENTS:
+                # ohne Session-Reset: offene (Lese-)Transaktion selbst beenden
+                try:
+                    self._conn.rollback()
+                except errors.Error:
+                    pass
+            self._conn.close()
+        finally:
+            self._pool.release(self._conn)
+
+
+def _conn_key(conn):
+    # PooledMySQLConnection hält die echte Connection in _cnx
+    return id(getattr(conn, "_cnx", conn))
+
 # Init db
-_pool = None
-
-def _get_pool():
-    global _pool
-    if _pool is None:
-        # Check: ENV wirklich gesetzt?
-        missing = [k for k, v in DB_CONFIG.items() if not v]
-        if missing:
-            raise RuntimeError(f"Missing DB env vars: {missing}")
-
-        _pool = pooling.MySQLConnectionPool(
-            pool_name="pool",
-            pool_size=5,
-            **DB_CONFIG
-        )
-    return _pool
+# Ein Pool braucht get_conn() und snapshot(); die Connections die Teile der
+# mysql-connector-API, die hier benutzt werden (cursor, commit, rollback, close).
+if DB_BACKEND == "sqlite":
+    import sqlite_backend
+    primary_pool = sqlite_backend.SQLitePool()
+    replica_pool = None
+else:
+    primary_pool = ConnectionPool("primary", DB_CONFIG)
+    replica_pool = ConnectionPool("replica", REPLICA_CONFIG) if REPLICA_CONFIG["host"] else None
 
 def get_conn():
-    return _get_pool().get_connection()
+    """Connection zum Primary (für alle Writes)."""
+    return primary_pool.get_conn()
 
-# DB-Helper
-def db_read(sql, params=None, single=False):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(sql, params or ())
-
-        if single:
-            # liefert EIN Dict oder None
-            row = cur.fetchone()
-            print("db_read(single=True) ->", row)   # DEBUG
-            return row
-        else:
-            # liefert Liste von Dicts (evtl. [])
-            rows = cur.fetchall()
-            print("db_read(single=False) ->", rows)  # DEBUG
-            return rows
+# -------- Read/Write-Splitting --------
 
-    finally:
+ROUTING_STATS = {"primary": 0, "replica": 0, "read_your_writes": 0}
+
+def _route_count(key):
+    with _stats_lock:
+        ROUTING_STATS[key] += 1
+
+def mark_written():
+    """Merkt sich für Request + Session, dass gerade geschrieben wurde."""
+    if replica_pool is None:
+        return
+    from flask import g, has_request_context, session
+    if has_request_context():
+        g._db_wrote = True
+        session["_db_wrote_until"] = time.time() + READ_YOUR_WRITES_WINDOW
+
+def read_from_primary():
+    """True, wenn Reads (wegen read-your-writes) zum Primary müssen."""
+    if replica_pool is None:
+        return True
+    from flask import g, has_request_context, session
+    if has_request_context() and (
+        g.get("_db_wrote") or session.get("_db_wrote_until", 0) > time.time()
+    ):
+        _route_count("read_your_writes")
+        return True
+    return False
+
+def get_read_conn(primary=None):
+    """Connection für Reads: Replica, ausser es gibt keins oder es wurde gerade geschrieben."""
+    if primary is None:
+        primary = read_from_primary()
+    if replica_pool is None:
+        return primary_pool.get_conn()
+    if primary:
+        _route_count("primary")
+        return primary_pool.get_conn()
+    _route_count("replica")
+    return replica_pool.get_conn()
+
+# -------- Prepared-Statement-Cache --------
+
+STMT_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+# conn_key -> (connection_id, OrderedDict((sql, dictionary) -> (cursor, sql)))
+_stmt_caches = {}
+
+def _stmt_cache(conn):
+    # Der Pool verbindet still neu (wait_timeout, Server-Neustart) -> neue
+    # Session, die alten Statement-IDs gibt es nicht mehr (Fehler 1243)
+    key = _conn_key(conn)
+    session = conn.connection_id
+    entry = _stmt_caches.get(key)
+    if entry is None or entry[0] != session:
+        if entry is not None:
+            _count_stmt("invalidations")
+        entry = _stmt_caches[key] = (session, OrderedDict())
+    return entry[1]
+
+@contextmanager
+def statement(conn, sql, dictionary=False):
+    """
+    Liefert (cursor, sql) für ein Statement. Mit PREPARED_STATEMENTS kommt
+    der Cursor aus dem LRU-Cache der Connection und bleibt nach dem Block
+    offen; sonst wird ein normaler Cursor erzeugt und wieder geschlossen.
+    """
+    if not PREPARED_STATEMENTS:
+        cur = conn.cursor(dictionary=dictionary)
         try:
-            cur.close()
-        except:
-            pass
-        conn.close()
+            yield cur, sql
+        finally:
+            try:
+                cur.close()
+            except:
+                pass
+        return
 
+    cache = _stmt_cache(conn)
+    key = (sql, dictionary)
+    entry = cache.get(key)
+    if entry is not None:
+        cache.move_to_end(key)
+        _count_stmt("hits")
+    else:
+        _count_stmt("misses")
+        # der Cursor prüft per Identität, ob neu vorbereitet werden muss
+        # -> immer dasselbe str-Objekt übergeben
+        entry = (conn.cursor(prepared=True, dictionary=dictionary), sql)
+        cache[key] = entry
+        while len(cache) > STMT_CACHE_SIZE:
+            _, (old, _) = cache.popitem(last=False)
+            _count_stmt("evictions")
+            try:
+                old.close()
+            except:
+                pass
 
-def db_write(sql, params=None):
-    conn = get_conn()
+    cur = entry[0]
     try:
-        cur = conn.cursor()
-        cur.execute(sql, params or ())
-        conn.commit()
-        print("db_write OK:", sql, params)  # DEBUG
-    finally:
+        yield entry
+        # ungelesene Zeilen verwerfen, damit der Cursor wiederverwendbar ist
+        if cur.with_rows and conn.unread_result:
+            cur.fetchall()
+    except Exception:
+        cache.pop(key, None)
         try:
             cur.close()
         except:
             pass
-        conn.close()
+        raise
 
-def init_schema_and_seed():
+def _count_stmt(key):
+    with _stats_lock:
+        STMT_CACHE_STATS[key] += 1
+
+def _stmt_cache_collector():
+    with _stats_lock:
+        stats = dict(STMT_CACHE_STATS)
+    yield "db_stmt_cache_hits_total", "counter", "Prepared Statement aus dem Cache", stats["hits"]
+    yield "db_stmt_cache_misses_total", "counter", "Prepared Statement neu vorbereitet", stats["misses"]
+    yield "db_stmt_cache_evictions_total", "counter", "Aus dem LRU verdrängte Statements", stats["evictions"]
+    yield "db_stmt_cache_invalidations_total", "counter", "Caches verworfen wegen neuer Session", stats["invalidations"]
+    yield "db_stmt_cache_size", "gauge", "Vorbereitete Statements (alle Connections)", sum(
+        len(c) for _, c in list(_stmt_caches.values())
+    )
+
+metrics.register_collector(_stmt_cache_collector)
+
+def pool_stats():
+    stats = primary_pool.snapshot()
+    if replica_pool is not None:
+        stats["replica"] = replica_pool.snapshot()
+    with _stats_lock:
+        stats["routing"] = dict(ROUTING_STATS)
+    return stats
+
+def _pool_collector():
+    pools = [primary_pool] + ([replica_pool] if replica_pool is not None else [])
+    snapshots = {(("pool", p.name),): p.snapshot() for p in pools}
+
+    def per_pool(key):
+        return {labels: stats[key] for labels, stats in snapshots.items()}
+
+    yield "db_pool_size", "gauge", "Connections im Pool", per_pool("size")
+    yield "db_pool_in_use", "gauge", "Aktuell ausgecheckte Connections", per_pool("in_use")
+    yield "db_pool_checkouts_total", "counter", "Ausgegebene Connections", per_pool("checkouts")
+    yield "db_pool_waits_total", "counter", "Checkouts, die warten mussten", per_pool("waits")
+    yield "db_pool_wait_seconds_total", "counter", "Summe der Wartezeit", per_pool("wait_time")
+    yield "db_pool_timeouts_total", "counter", "Checkouts mit Timeout", per_pool("timeouts")
+    yield "db_pool_broken_total", "counter", "Kaputte Connections (neu verbunden)", per_pool("broken")
+    with _stats_lock:
+        routing = dict(ROUTING_STATS)
+    yield "db_read_route_total", "counter", "Routing-Entscheide für Reads", {
+        (("target", "primary"),): routing["primary"],
+        (("target", "replica"),): routing["replica"],
+    }
+    yield "db_read_your_writes_total", "counter", "Reads, die wegen eines Writes zum Primary gingen", routing["read_your_writes"]
+
+metrics.register_collector(_pool_collector)
+
+
+class timed:
+    """
+    Misst ein Statement und meldet es an metrics (Latenz, Zeilen, Fehler,
+    Slow-Query-Log). rows kann im Block gesetzt werden.
+    """
+    def __init__(self, kind, sql):
+        self.kind = kind
+        self.sql = sql
+        self.rows = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics.observe_query(self.kind, self.sql, time.perf_counter() - self.started, self.rows, exc)
+        return False
+
+# -------- Request-scoped Connection (opt-in) --------
+# DB_REQUEST_SCOPED_CONN=1 -> pro Flask-Request wird höchstens EINE
+# Connection aus dem Pool geholt (lazy, auf flask.g) und von allen
+# db_read/db_write/transaction-Aufrufen geteilt. Zurückgegeben wird sie
+# im teardown-Handler (siehe init_app).
+REQUEST_SCOPED_CONN = os.getenv("DB_REQUEST_SCOPED_CONN", "0") == "1"
+
+def _request_g():
+    if not REQUEST_SCOPED_CONN:
+        return None
+    from flask import g, has_app_context
+    return g if has_app_context() else None
+
+def acquire_conn(read=False, primary=None):
+    """
+    read=False -> Primary; read=True -> Replica bzw. Primary (siehe get_read_conn).
+    Mit DB_REQUEST_SCOPED_CONN wird pro Request und Ziel eine Connection geteilt.
+    """
+    if read:
+        if primary is None:
+            primary = read_from_primary()
+        if replica_pool is not None:
+            _route_count("primary" if primary else "replica")
+        # ohne Replica ist "Read" dasselbe wie Primary
+        read = not primary
+
+    pool = replica_pool if read else primary_pool
+    g = _request_g()
+    if g is None:
+        return pool.get_conn()
+
+    attr = "_db_conn_replica" if read else "_db_conn"
+    conn = g.get(attr)
+    if conn is None:
+        conn = pool.get_conn()
+        setattr(g, attr, conn)
+    return conn
+
+def release_conn(conn):
+    g = _request_g()
+    if g is not None and (g.get("_db_conn") is conn or g.get("_db_conn_replica") is conn):
+        # bleibt bis zum Ende des Requests ausgecheckt
+        return
+    conn.close()
+
+def _teardown_request_conn(exc=None):
+    g = _request_g()
+    if g is None:
+        return
+    for attr in ("_db_conn", "_db_conn_replica"):
+        conn = g.pop(attr, None)
+        if conn is not None:
+            try:
+                conn.rollback()
+            except:
+                pass
+            conn.close()
+
+def init_app(app):
+    app.teardown_appcontext(_teardown_request_conn)
+
+# DB-Helper
+def db_read(sql, params=None, single=False, primary=None):
+    # primary=None -> automatisch (Replica, ausser nach einem Write)
+    conn = acquire_conn(read=True, primary=primary)
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-
-        # -------- CREATE TABLES --------
-
-        # patient (muss zuerst!)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS patient (
-          patientennummer INT PRIMARY KEY,
-          `alter` INT,
-          name TEXT,
-          krankenkasse TEXT,
-          krankheiten TEXT,
-          `ehemalige aufenthalte` TEXT,
-          `ehemalige medikamente` TEXT,
-          bettnummer INT
-        );
-        """)
-
-        # medizin
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS medizin (
-          fachname VARCHAR(255) PRIMARY KEY,
-          dosierung VARCHAR(255)
-        );
-        """)
-
-        # arzt
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS arzt (
-          ärztenummer INT PRIMARY KEY,
-          name VARCHAR(255),
-          spezialisierung VARCHAR(255),
-          anstellzeit INT
-        );
-        """)
-
-        # aktuellerAufenthalt
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS aktuellerAufenthalt (
-          bettnummer INT PRIMARY KEY,
-          pflegebedarf TEXT,
-          anfangsdatum DATE
-        );
-        """)
-
-        # nimmt (Patient ↔ Medizin)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS nimmt (
-          patientennummer INT,
-          fachname VARCHAR(255),
-          PRIMARY KEY (patientennummer, fachname),
-          FOREIGN KEY (patientennummer) REFERENCES patient(patientennummer),
-          FOREIGN KEY (fachname) REFERENCES medizin(fachname)
-        );
-        """)
-
-        # behandelt (Patient ↔ Arzt)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS behandelt (
-          patientennummer INT,
-          ärztenummer INT,
-          PRIMARY KEY (patientennummer, ärztenummer),
-          FOREIGN KEY (patientennummer) REFERENCES patient(patientennummer),
-          FOREIGN KEY (ärztenummer) REFERENCES arzt(ärztenummer)
-        );
-        """)
-
-        # -------- SEEDS (Reihenfolge wichtig) --------
-
-        # medizin zuerst (weil nimmt darauf zeigt)
-        cur.execute("""
-        INSERT INTO medizin (fachname, dosierung)
-        VALUES
-          ('Salbutamol', '2 Hübe bei Atemnot'),
-          ('Metformin', '500 mg morgens und abends'),
-          ('Ibuprofen', '400 mg bei Schmerzen')
-        ON DUPLICATE KEY UPDATE fachname = fachname;
-        """)
-
-        # arzt (weil behandelt darauf zeigt)
-        cur.execute("""
-        INSERT INTO arzt (ärztenummer, name, spezialisierung, anstellzeit)
-        VALUES
-          (1, 'Dr. Anna Weber', 'Innere Medizin', 8),
-          (2, 'Dr. Lukas Frei', 'Neurologie', 5),
-          (3, 'Dr. Sarah Müller', 'Orthopädie', 10)
-        ON DUPLICATE KEY UPDATE ärztenummer = ärztenummer;
-        """)
-
-        # patient (mit ehemalige Aufenthalte)
-        cur.execute("""
-        INSERT INTO patient
-          (patientennummer, `alter`, name, krankenkasse, krankheiten,
-           `ehemalige aufenthalte`, `ehemalige medikamente`, bettnummer)
-        VALUES
-          (1001, 34, 'Mila Meier', 'CSS', 'Asthma',
-           '2018: Lungenentzündung; 2019: Bronchitis', 'Salbutamol', 12),
-          (1002, 58, 'Noah Keller', 'Helsana', 'Diabetes Typ 2',
-           '2020: Bluthochdruck; 2021: Knie-OP', 'Metformin', 14),
-          (1003, 22, 'Lea Schmid', 'SWICA', 'Migräne',
-           '2019: Beobachtung Neurologie', 'Ibuprofen', 15)
-        ON DUPLICATE KEY UPDATE patientennummer = patientennummer;
-        """)
-
-        # aktueller Aufenthalt
-        cur.execute("""
-        INSERT INTO aktuellerAufenthalt (bettnummer, pflegebedarf, anfangsdatum)
-        VALUES
-          (12, 'mittel', '2026-01-10'),
-          (14, 'hoch', '2026-01-08'),
-          (15, 'niedrig', '2026-01-12')
-        ON DUPLICATE KEY UPDATE bettnummer = bettnummer;
-        """)
-
-        # nimmt (braucht patient + medizin)
-        cur.execute("""
-        INSERT INTO nimmt (patientennummer, fachname)
-        VALUES
-          (1001, 'Salbutamol'),
-          (1002, 'Metformin'),
-          (1003, 'Ibuprofen')
-        ON DUPLICATE KEY UPDATE patientennummer = patientennummer;
-        """)
-
-        # behandelt (braucht patient + arzt)
-        cur.execute("""
-        INSERT INTO behandelt (patientennummer, ärztenummer)
-        VALUES
-          (1001, 1),
-          (1002, 3),
-          (1003, 2)
-        ON DUPLICATE KEY UPDATE patientennummer = patientennummer;
-        """)
+        with statement(conn, sql, dictionary=True) as (cur, stmt), timed("read", sql) as t:
+            cur.execute(stmt, tuple(params or ()))
 
-        conn.commit()
-        print("✅ init_schema_and_seed: alle Tabellen + Seed-Daten OK")
+            if single:
+                # liefert EIN Dict oder None
+                row = cur.fetchone()
+                t.rows = 0 if row is None else 1
+                return row
+            else:
+                # liefert Liste von Dicts (evtl. [])
+                rows = cur.fetchall()
+                t.rows = len(rows)
+                return rows
+
+    finally:
+        release_conn(conn)
+
+
+# -------- Parallele Reads --------
+# Threads für read_many(); jeder Thread holt sich eine eigene Pool-Connection.
+READ_MANY_WORKERS = int(os.getenv("DB_READ_MANY_WORKERS", str(max(1, min(4, POOL_SIZE - 1)))))
+_read_executor = None
+_read_executor_lock = threading.Lock()
+
+def _get_read_executor():
+    global _read_executor
+    with _read_executor_lock:
+        if _read_executor is None:
+            _read_executor = ThreadPoolExecutor(
+                max_workers=READ_MANY_WORKERS,
+                thread_name_prefix="db-read"
+            )
+    return _read_executor
+
+def _split_query(query):
+    # "SELECT ..." oder ("SELECT ...", params)
+    if isinstance(query, str):
+        return query, None
+    return query[0], query[1]
 
-    except Exception as e:
-        print("⚠️ init_schema_and_seed failed:", e)
+def read_many(queries, primary=None):
+    """
+    Führt mehrere UNABHÄNGIGE Reads parallel aus.
 
+        res = read_many({"patients": "SELECT ...", "meds": ("SELECT ... %s", (x,))})
+        res["patients"] -> Liste von Dicts
+
+    Latenz ~ langsamste einzelne Query statt Summe aller Queries.
+    Mit DB_REQUEST_SCOPED_CONN laufen die Queries innerhalb eines Requests
+    nacheinander auf der Request-Connection.
+    """
+    # Routing hier entscheiden: die Worker-Threads haben keinen Request-Kontext
+    if primary is None:
+        primary = read_from_primary()
+
+    # der Request hält schon eine Connection; Worker würden je eine weitere
+    # holen und könnten bei vollem Pool aufeinander warten
+    if len(queries) <= 1 or _request_g() is not None:
+        return {key: db_read(*_split_query(q), primary=primary) for key, q in queries.items()}
+
+    executor = _get_read_executor()
+    # jeder Worker läuft in einer Kopie des aufrufenden Kontexts, damit
+    # ContextVars des Aufrufers (z.B. Zähler in Query-Hooks) sichtbar bleiben
+    futures = {
+        key: executor.submit(contextvars.copy_context().run, db_read, *_split_query(q), primary=primary)
+        for key, q in queries.items()
+    }
+    return {key: future.result() for key, future in futures.items()}
+
+
+def db_read_iter(sql, params=None, chunk_size=500):
+    """
+    Generator-Variante von db_read: ungepufferter Cursor, Zeilen werden
+    in Chunks von chunk_size geholt. Die Connection bleibt belegt, bis
+    der Generator fertig (oder geschlossen) ist.
+    """
+    # wie db_read über acquire_conn: Pool-Wartezeit, Routing-Zähler und
+    # (mit DB_REQUEST_SCOPED_CONN) die Connection des Requests
+    conn = acquire_conn(read=True)
+    t = timed("read_iter", sql)
+    t.rows = 0
+    try:
+        cur = conn.cursor(dictionary=True, buffered=False)
+        with t:
+            cur.execute(sql, params or ())
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                t.rows += len(rows)
+                for row in rows:
+                    yield row
     finally:
+        try:
+            # ungelesene Zeilen verwerfen, sonst ist die Connection blockiert
+            conn.consume_results()
+        except:
+            pass
         try:
             cur.close()
         except:
             pass
+        release_conn(conn)
+
+
+# -------- Tabellen-Versionen + Lookup-Cache --------
+# Jede Schreiboperation erhöht die Version der betroffenen Tabelle.
+# cached_read() liefert so lange das Ergebnis aus dem Speicher, bis sich
+# eine der beteiligten Tabellen ändert. Die Versionen gelten pro
+# Worker-Prozess: Writes anderer Worker oder der CLI-Skripte sieht ein
+# Eintrag erst nach LOOKUP_CACHE_TTL Sekunden.
+
+TABLE_VERSIONS = {}
+# Zeitpunkt (Unix-Zeit) der letzten Änderung pro Tabelle, für Last-Modified.
+# Vor der ersten Änderung gilt der Prozessstart.
+TABLE_CHANGED_AT = {}
+STARTED_AT = time.time()
+_versions_lock = threading.Lock()
+
+_WRITE_TABLE_RE = re.compile(
+    r"^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|DELETE\s+FROM|UPDATE)\s+`?(\w+)`?",
+    re.IGNORECASE
+)
+
+def written_table(sql):
+    m = _WRITE_TABLE_RE.match(sql)
+    return m.group(1) if m else None
+
+def bump_table_version(*tables):
+    now = time.time()
+    with _versions_lock:
+        for table in tables:
+            if table:
+                TABLE_VERSIONS[table] = TABLE_VERSIONS.get(table, 0) + 1
+                TABLE_CHANGED_AT[table] = now
+
+def table_version(table):
+    return TABLE_VERSIONS.get(table, 0)
+
+def table_changed_at(table):
+    return TABLE_CHANGED_AT.get(table, STARTED_AT)
+
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "60"))
+
+# key -> (versions, expires_at, rows)
+_lookup_cache = {}
+_lookup_lock = threading.Lock()
+
+def _lookup_hit(key, versions):
+    with _lookup_lock:
+        entry = _lookup_cache.get(key)
+    if entry and entry[0] == versions and entry[1] > time.monotonic():
+        return entry
+    return None
+
+def cached_read(tables, sql, params=None):
+    """
+    Wie db_read, aber gecacht bis sich eine der Tabellen in `tables` ändert.
+    Gedacht für kleine Lookup-Listen (Dropdowns). Ergebnis nicht verändern!
+    Spätestens nach LOOKUP_CACHE_TTL Sekunden wird neu gelesen.
+
+    Gelesen wird immer vom Primary: ein nachhinkendes Replica würde alte
+    Zeilen unter der neuen Version ablegen (bis zum nächsten Write).
+    """
+    key = (sql, tuple(params or ()))
+    versions = tuple(table_version(t) for t in tables)
+    entry = _lookup_hit(key, versions)
+    if entry:
+        return entry[2]
+
+    rows = db_read(sql, params, primary=True)
+    with _lookup_lock:
+        _lookup_cache[key] = (versions, time.monotonic() + LOOKUP_CACHE_TTL, rows)
+    return rows
+
+def cached_read_many(queries):
+    """
+    cached_read für mehrere Lookups: {key: (tables, sql)}.
+    Treffer kommen aus dem Cache, der Rest wird parallel per read_many geladen.
+    """
+    result = {}
+    missing = {}
+    for key, (tables, sql) in queries.items():
+        versions = tuple(table_version(t) for t in tables)
+        entry = _lookup_hit((sql, ()), versions)
+        if entry:
+            result[key] = entry[2]
+        else:
+            missing[key] = (sql, versions)
+
+    if missing:
+        loaded = read_many({key: sql for key, (sql, _) in missing.items()}, primary=True)
+        expires_at = time.monotonic() + LOOKUP_CACHE_TTL
+        with _lookup_lock:
+            for key, (sql, versions) in missing.items():
+                _lookup_cache[(sql, ())] = (versions, expires_at, loaded[key])
+        result.update(loaded)
+
+    return result
+
+
+# -------- Keyset-Pagination --------
+
+PAGE_SIZE = 50
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=str, ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+class InvalidCursor(ValueError):
+    """?after=/?before= ist kein gültiges Token (manipuliert, abgeschnitten ...)."""
+
+def decode_cursor(token, arity=None):
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError, binascii.Error) as e:
+        raise InvalidCursor(f"Ungültiger Cursor: {token!r}") from e
+    if (
+        not isinstance(values, list)
+        or (arity is not None and len(values) != arity)
+        or not all(v is None or isinstance(v, (str, int, float)) for v in values)
+    ):
+        raise InvalidCursor(f"Ungültiger Cursor: {token!r}")
+    return values
+
+def _keyset_condition(exprs, op):
+    # (a, b) > (x, y)  ->  a > x OR (a = x AND b > y)
+    # ausgeschrieben, damit MySQL sicher den Index (Range-Scan) nutzt
+    parts = []
+    for i in range(len(exprs)):
+        eq = [f"{e} = %s" for e in exprs[:i]]
+        parts.append("(" + " AND ".join(eq + [f"{exprs[i]} {op} %s"]) + ")")
+    return "(" + " OR ".join(parts) + ")"
+
+def _keyset_params(values):
+    params = []
+    for i in range(len(values)):
+        params.extend(values[:i + 1])
+    return params
+
+def db_read_page(sql, keys, after=None, before=None, where=None, params=None, limit=PAGE_SIZE):
+    """
+    Liest eine Seite per Keyset-Pagination (kein OFFSET -> konstante Latenz).
+
+    sql:    "SELECT ... FROM ... [JOIN ...]" ohne WHERE / ORDER BY / LIMIT
+    keys:   Liste von (sql_ausdruck, spaltenname_im_row_dict), z.B.
+            [("n.patientennummer", "patientennummer"), ("n.fachname", "fachname")]
+    after:  Cursor-Token -> Seite nach diesem Schlüssel
+    before: Cursor-Token -> Seite vor diesem Schlüssel
+            (ungültiges Token -> InvalidCursor)
+
+    Liefert {"rows": [...], "next": token|None, "prev": token|None}
+    """
+    exprs = [e for e, _ in keys]
+    names = [n for _, n in keys]
+
+    conditions = []
+    all_params = list(params or ())
+    if where:
+        conditions.append(where)
+
+    backwards = before is not None
+    cursor = before if backwards else after
+    if cursor is not None:
+        values = decode_cursor(cursor, arity=len(keys))
+        conditions.append(_keyset_condition(exprs, "<" if backwards else ">"))
+        all_params.extend(_keyset_params(values))
+
+    direction = "DESC" if backwards else "ASC"
+    order_by = ", ".join(f"{e} {direction}" for e in exprs)
+
+    query = sql
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {order_by} LIMIT {int(limit) + 1}"
+
+    rows = db_read(query, tuple(all_params))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def key_of(row):
+        return encode_cursor(row[n] for n in names)
+
+    if backwards:
+        has_next = True
+        has_prev = has_more
+    else:
+        has_next = has_more
+        has_prev = cursor is not None
+
+    return {
+        "rows": rows,
+        "next": key_of(rows[-1]) if rows and has_next else None,
+        "prev": key_of(rows[0]) if rows and has_prev else None,
+    }
+
+
+def db_write(sql, params=None):
+    conn = acquire_conn()
+    try:
+        with statement(conn, sql) as (cur, stmt), timed("write", sql) as t:
+            cur.execute(stmt, tuple(params or ()))
+            conn.commit()
+            t.rows = cur.rowcount
+        bump_table_version(written_table(sql))
+        mark_written()
+    finally:
+        release_conn(conn)
+
+# Max. Werte pro "IN (...)" bei read_in/write_in
+IN_CHUNK_SIZE = int(os.getenv("DB_IN_CHUNK_SIZE", "500"))
+
+def _in_chunks(sql, values, chunk_size):
+    # "... IN {ids} ..." -> ("... IN (%s, %s) ...", chunk) pro Chunk
+    values = list(values)
+    for i in range(0, len(values), chunk_size):
+        chunk = values[i:i + chunk_size]
+        yield sql.replace("{ids}", "(" + ", ".join(["%s"] * len(chunk)) + ")"), chunk
+
+# Transaktionen: mehrere Statements auf EINER Connection, EIN Commit
+class Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+        # normaler Cursor für executemany (wird zu einem Multi-Row-INSERT)
+        self.cur = conn.cursor(dictionary=True)
+        # betroffene Tabellen -> Version wird nach dem Commit erhöht
+        self.tables = set()
+
+    def read(self, sql, params=None, single=False):
+        with statement(self.conn, sql, dictionary=True) as (cur, stmt), timed("tx_read", sql) as t:
+            cur.execute(stmt, tuple(params or ()))
+            if single:
+                row = cur.fetchone()
+                t.rows = 0 if row is None else 1
+                return row
+            rows = cur.fetchall()
+            t.rows = len(rows)
+            return rows
+
+    def write(self, sql, params=None):
+        with statement(self.conn, sql) as (cur, stmt), timed("tx_write", sql) as t:
+            cur.execute(stmt, tuple(params or ()))
+            t.rows = cur.rowcount
+        self.tables.add(written_table(sql))
+        return t.rows
+
+    def read_in(self, sql, values, chunk_size=IN_CHUNK_SIZE):
+        """read() mit "{ids}" im SQL, in Chunks à chunk_size Werte."""
+        rows = []
+        for chunk_sql, chunk in _in_chunks(sql, values, chunk_size):
+            rows.extend(self.read(chunk_sql, chunk))
+        return rows
+
+    def write_in(self, sql, values, chunk_size=IN_CHUNK_SIZE):
+        """write() mit "{ids}" im SQL, in Chunks. Liefert die Summe der rowcounts."""
+        return sum(
+            self.write(chunk_sql, chunk)
+            for chunk_sql, chunk in _in_chunks(sql, values, chunk_size)
+        )
+
+    def write_many(self, sql, seq_params):
+        with timed("tx_write_many", sql) as t:
+            self.cur.executemany(sql, seq_params)
+            t.rows = self.cur.rowcount
+        self.tables.add(written_table(sql))
+        return self.cur.rowcount
+
+
+@contextmanager
+def transaction():
+    """
+    with transaction() as tx:
+        tx.write(...)
+        tx.write(...)
+    -> Commit am Ende, Rollback bei Exception.
+    """
+    conn = acquire_conn()
+    tx = Transaction(conn)
+    try:
+        yield tx
+        conn.commit()
+        bump_table_version(*tx.tables)
+        if tx.tables:
+            mark_written()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         try:
-            conn.close()
+            tx.cur.close()
         except:
             pass
+        release_conn(conn)
+
+# -------- Volltextsuche --------
+# Whitelist der durchsuchbaren Spalten pro Tabelle:
+#   "fulltext" -> MATCH ... AGAINST über einen FULLTEXT-Index
+#                 (angelegt von db/migrations/0003_fulltext_indexes.py);
+#                 bei SQLite ein LIKE auf Teilstrings
+#   "exact"    -> Gleichheit auf einer (indexierten) Zahl-Spalte
+#   "name"     -> Gleichheit auf einer (indexierten) Text-Spalte
+SEARCH_COLUMNS = {
+    "patient": {
+        "patientennummer": "exact",
+        "name": "fulltext",
+        "krankenkasse": "fulltext",
+        "krankheiten": "fulltext",
+        "ehemalige aufenthalte": "fulltext",
+        "ehemalige medikamente": "fulltext",
+    },
+    "medizin": {
+        "fachname": "fulltext",
+        "dosierung": "fulltext",
+    },
+    "arzt": {
+        "ärztenummer": "exact",
+        "name": "fulltext",
+        "spezialisierung": "fulltext",
+    },
+    "aktuellerAufenthalt": {
+        "bettnummer": "exact",
+        "pflegebedarf": "fulltext",
+    },
+    "nimmt": {
+        "patientennummer": "exact",
+    },
+    "behandelt": {
+        "patientennummer": "exact",
+    },
+    "ehemaliger_aufenthalt": {
+        "patientennummer": "exact",
+        "jahr": "exact",
+    },
+    "ehemaliges_medikament": {
+        "patientennummer": "exact",
+        # wer hat Medikament X je genommen (idx_ehemaliges_medikament_fachname)
+        "fachname": "name",
+    },
+}
+
+def db_search(table, column, value, page=0, limit=PAGE_SIZE):
+    """
+    Suche in einer whitelisted Spalte, bei Volltext nach Relevanz sortiert.
+    Liefert {"rows": [...], "page": n, "has_next": bool}.
+    """
+    kind = SEARCH_COLUMNS.get(table, {}).get(column)
+    if kind is None:
+        raise ValueError(f"Spalte '{column}' ist in '{table}' nicht durchsuchbar.")
+
+    page = max(0, int(page))
+    limit = int(limit)
+    if kind == "fulltext" and DB_BACKEND == "sqlite":
+        sql = (
+            f"SELECT * FROM `{table}` WHERE `{column}` LIKE %s "
+            f"LIMIT {limit + 1} OFFSET {page * limit}"
+        )
+        params = ("%" + value + "%",)
+    elif kind == "fulltext":
+        match = f"MATCH(`{column}`) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        sql = (
+            f"SELECT *, {match} AS _score FROM `{table}` WHERE {match} "
+            f"ORDER BY _score DESC LIMIT {limit + 1} OFFSET {page * limit}"
+        )
+        params = (value, value)
+    else:
+        sql = f"SELECT * FROM `{table}` WHERE `{column}` = %s LIMIT {limit + 1} OFFSET {page * limit}"
+        params = (int(value) if kind == "exact" else value,)
+
+    rows = db_read(sql, params)
+    for row in rows:
+        row.pop("_score", None)
+    return {"rows": rows[:limit], "page": page, "has_next": len(rows) > limit}
+
+def init_schema_and_seed():
+    """
+    Legt das Schema an bzw. bringt es auf den neuesten Stand.
+    Das eigentliche Schema steht in db/migrations/ (siehe migrations.py).
+    """
+    import migrations
+    version = migrations.upgrade()
+    print(f"✅ init_schema_and_seed: Schema auf Version {version}")
+    return version
@@ -0,0 +1,64 @@
+-- Grundschema: Login/Todos + Krankenhaus-Tabellen
+-- (IF NOT EXISTS, damit bestehende Installationen übernommen werden können)
+
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(250) NOT NULL UNIQUE,
+    password VARCHAR(250) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS todos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    content VARCHAR(100),
+    due DATETIME,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+-- patient (muss zuerst!)
+CREATE TABLE IF NOT EXISTS patient (
+  patientennummer INT PRIMARY KEY,
+  `alter` INT,
+  name TEXT,
+  krankenkasse TEXT,
+  krankheiten TEXT,
+  `ehemalige aufenthalte` TEXT,
+  `ehemalige medikamente` TEXT,
+  bettnummer INT
+);
+
+CREATE TABLE IF NOT EXISTS medizin (
+  fachname VARCHAR(255) PRIMARY KEY,
+  dosierung VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS arzt (
+  ärztenummer INT PRIMARY KEY,
+  name VARCHAR(255),
+  spezialisierung VARCHAR(255),
+  anstellzeit INT
+);
+
+CREATE TABLE IF NOT EXISTS aktuellerAufenthalt (
+  bettnummer INT PRIMARY KEY,
+  pflegebedarf TEXT,
+  anfangsdatum DATE
+);
+
+-- nimmt (Patient ↔ Medizin)
+CREATE TABLE IF NOT EXISTS nimmt (
+  patientennummer INT,
+  fachname VARCHAR(255),
+  PRIMARY KEY (patientennummer, fachname),
+  FOREIGN KEY (patientennummer) REFERENCES patient(patientennummer),
+  FOREIGN KEY (fachname) REFERENCES medizin(fachname)
+);
+
+-- behandelt (Patient ↔ Arzt)
+CREATE TABLE IF NOT EXISTS behandelt (
+  patientennummer INT,
+  ärztenummer INT,
+  PRIMARY KEY (patientennummer, ärztenummer),
+  FOREIGN KEY (patientennummer) REFERENCES patient(patientennummer),
+  FOREIGN KEY (ärztenummer) REFERENCES arzt(ärztenummer)
+);
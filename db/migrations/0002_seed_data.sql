@@ -0,0 +1,54 @@
+-- Beispieldaten (Reihenfolge wichtig wegen Foreign Keys)
+
+-- medizin zuerst (weil nimmt darauf zeigt)
+INSERT INTO medizin (fachname, dosierung)
+VALUES
+  ('Salbutamol', '2 Hübe bei Atemnot'),
+  ('Metformin', '500 mg morgens und abends'),
+  ('Ibuprofen', '400 mg bei Schmerzen')
+ON DUPLICATE KEY UPDATE fachname = fachname;
+
+-- arzt (weil behandelt darauf zeigt)
+INSERT INTO arzt (ärztenummer, name, spezialisierung, anstellzeit)
+VALUES
+  (1, 'Dr. Anna Weber', 'Innere Medizin', 8),
+  (2, 'Dr. Lukas Frei', 'Neurologie', 5),
+  (3, 'Dr. Sarah Müller', 'Orthopädie', 10)
+ON DUPLICATE KEY UPDATE ärztenummer = ärztenummer;
+
+-- patient (mit ehemalige Aufenthalte)
+INSERT INTO patient
+  (patientennummer, `alter`, name, krankenkasse, krankheiten,
+   `ehemalige aufenthalte`, `ehemalige medikamente`, bettnummer)
+VALUES
+  (1001, 34, 'Mila Meier', 'CSS', 'Asthma',
+   '2018: Lungenentzündung; 2019: Bronchitis', 'Salbutamol', 12),
+  (1002, 58, 'Noah Keller', 'Helsana', 'Diabetes Typ 2',
+   '2020: Bluthochdruck; 2021: Knie-OP', 'Metformin', 14),
+  (1003, 22, 'Lea Schmid', 'SWICA', 'Migräne',
+   '2019: Beobachtung Neurologie', 'Ibuprofen', 15)
+ON DUPLICATE KEY UPDATE patientennummer = patientennummer;
+
+-- aktueller Aufenthalt
+INSERT INTO aktuellerAufenthalt (bettnummer, pflegebedarf, anfangsdatum)
+VALUES
+  (12, 'mittel', '2026-01-10'),
+  (14, 'hoch', '2026-01-08'),
+  (15, 'niedrig', '2026-01-12')
+ON DUPLICATE KEY UPDATE bettnummer = bettnummer;
+
+-- nimmt (braucht patient + medizin)
+INSERT INTO nimmt (patientennummer, fachname)
+VALUES
+  (1001, 'Salbutamol'),
+  (1002, 'Metformin'),
+  (1003, 'Ibuprofen')
+ON DUPLICATE KEY UPDATE patientennummer = patientennummer;
+
+-- behandelt (braucht patient + arzt)
+INSERT INTO behandelt (patientennummer, ärztenummer)
+VALUES
+  (1001, 1),
+  (1002, 3),
+  (1003, 2)
+ON DUPLICATE KEY UPDATE patientennummer = patientennummer;
@@ -0,0 +1,20 @@
+# FULLTEXT-Indexe für die Suche im DB Explorer (siehe db.SEARCH_COLUMNS)
+from migrations import ensure_index
+
+INDEXES = [
+    ("patient", "ft_name", "name"),
+    ("patient", "ft_krankenkasse", "krankenkasse"),
+    ("patient", "ft_krankheiten", "krankheiten"),
+    ("patient", "ft_ehemalige_aufenthalte", "ehemalige aufenthalte"),
+    ("patient", "ft_ehemalige_medikamente", "ehemalige medikamente"),
+    ("medizin", "ft_fachname", "fachname"),
+    ("medizin", "ft_dosierung", "dosierung"),
+    ("arzt", "ft_name", "name"),
+    ("arzt", "ft_spezialisierung", "spezialisierung"),
+    ("aktuellerAufenthalt", "ft_pflegebedarf", "pflegebedarf"),
+]
+
+
+def upgrade(cur):
+    for table, name, column in INDEXES:
+        ensure_index(cur, table, name, f"CREATE FULLTEXT INDEX `{name}` ON `{table}` (`{column}`)")
@@ -0,0 +1,22 @@
+-- Vorgeschichte der Patienten als eigene, indexierte Tabellen
+-- (statt Freitext in patient.`ehemalige aufenthalte` / `ehemalige medikamente`)
+
+CREATE TABLE IF NOT EXISTS ehemaliger_aufenthalt (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  patientennummer INT NOT NULL,
+  jahr INT NULL,
+  diagnose VARCHAR(255) NOT NULL,
+  INDEX idx_ehemaliger_aufenthalt_jahr (jahr, patientennummer),
+  INDEX idx_ehemaliger_aufenthalt_patient (patientennummer, jahr),
+  FOREIGN KEY (patientennummer) REFERENCES patient(patientennummer) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS ehemaliges_medikament (
+  patientennummer INT NOT NULL,
+  fachname VARCHAR(255) NOT NULL,
+  PRIMARY KEY (patientennummer, fachname),
+  INDEX idx_ehemaliges_medikament_fachname (fachname, patientennummer),
+  -- fachname bewusst ohne Foreign Key auf medizin: Freitext aus der
+  -- Vorgeschichte, der Katalog bleibt davon unberührt
+  FOREIGN KEY (patientennummer) REFERENCES patient(patientennummer) ON DELETE CASCADE
+);
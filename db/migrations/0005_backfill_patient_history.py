@@ -0,0 +1,48 @@
+# Einmaliges Backfill: Freitext-Vorgeschichte -> ehemaliger_aufenthalt / ehemaliges_medikament
+from patient_history import parse_aufenthalte, parse_medikamente
+
+CHUNK_SIZE = 1000
+
+
+def upgrade(cur):
+    # falls ein früherer Lauf abgebrochen ist
+    cur.execute("DELETE FROM ehemaliger_aufenthalt")
+    cur.execute("DELETE FROM ehemaliges_medikament")
+
+    last = None
+    while True:
+        if last is None:
+            cur.execute(
+                "SELECT patientennummer, `ehemalige aufenthalte`, `ehemalige medikamente` "
+                "FROM patient ORDER BY patientennummer LIMIT %s", (CHUNK_SIZE,)
+            )
+        else:
+            cur.execute(
+                "SELECT patientennummer, `ehemalige aufenthalte`, `ehemalige medikamente` "
+                "FROM patient WHERE patientennummer > %s ORDER BY patientennummer LIMIT %s",
+                (last, CHUNK_SIZE)
+            )
+        rows = cur.fetchall()
+        if not rows:
+            break
+
+        aufenthalte = []
+        medikamente = []
+        for patientennummer, aufenthalte_text, medikamente_text in rows:
+            for jahr, diagnose in parse_aufenthalte(aufenthalte_text):
+                aufenthalte.append((patientennummer, jahr, diagnose))
+            for name in parse_medikamente(medikamente_text):
+                medikamente.append((patientennummer, name))
+
+        if aufenthalte:
+            cur.executemany(
+                "INSERT INTO ehemaliger_aufenthalt (patientennummer, jahr, diagnose) VALUES (%s, %s, %s)",
+                aufenthalte
+            )
+        if medikamente:
+            cur.executemany(
+                "INSERT IGNORE INTO ehemaliges_medikament (patientennummer, fachname) VALUES (%s, %s)",
+                medikamente
+            )
+
+        last = rows[-1][0]
@@ -0,0 +1,42 @@
+# Änderungszeitpunkt pro Zeile (für /api/<entity>?since=...)
+from db import DB_BACKEND
+from migrations import ensure_index, has_column
+
+TABLES = ["patient", "arzt", "medizin", "aktuellerAufenthalt", "nimmt", "behandelt"]
+
+
+def upgrade(cur):
+    for table in TABLES:
+        if not has_column(cur, table, "geaendert_am"):
+            if DB_BACKEND == "sqlite":
+                _add_sqlite(cur, table)
+            else:
+                # bestehende Zeilen bekommen den Zeitpunkt der Migration
+                cur.execute(
+                    f"ALTER TABLE `{table}` ADD COLUMN geaendert_am TIMESTAMP NOT NULL "
+                    f"DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+                )
+        ensure_index(
+            cur, table, f"idx_{table}_geaendert_am",
+            f"CREATE INDEX `idx_{table}_geaendert_am` ON `{table}` (geaendert_am)"
+        )
+
+
+def _add_sqlite(cur, table):
+    # SQLite: kein ON UPDATE und kein CURRENT_TIMESTAMP-Default bei ADD COLUMN -> Trigger
+    cur.execute(f"ALTER TABLE `{table}` ADD COLUMN geaendert_am DATETIME")
+    cur.execute(f"UPDATE `{table}` SET geaendert_am = CURRENT_TIMESTAMP")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS `trg_{table}_geaendert_insert`
+        AFTER INSERT ON `{table}` FOR EACH ROW WHEN NEW.geaendert_am IS NULL
+        BEGIN
+          UPDATE `{table}` SET geaendert_am = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS `trg_{table}_geaendert_update`
+        AFTER UPDATE ON `{table}` FOR EACH ROW WHEN NEW.geaendert_am IS OLD.geaendert_am
+        BEGIN
+          UPDATE `{table}` SET geaendert_am = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+        END
+    """)
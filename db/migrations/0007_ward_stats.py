@@ -0,0 +1,34 @@
+# Tabellen für die vorberechnete Stations-Statistik (siehe ward_stats.py) + Erstbefüllung
+import ward_stats
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS stat_pflegebedarf (
+      -- SHA-1 von pflegebedarf (TEXT wie in aktuellerAufenthalt, siehe ward_stats.level_key)
+      schluessel CHAR(40) PRIMARY KEY,
+      pflegebedarf TEXT NOT NULL,
+      betten INT NOT NULL DEFAULT 0,
+      -- Anzahl/Summe der Anfangsdaten als Tagesnummer -> mittlere Aufenthaltsdauer
+      datum_anzahl INT NOT NULL DEFAULT 0,
+      datum_summe BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stat_arzt (
+      ärztenummer INT PRIMARY KEY,
+      patienten INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stat_zaehler (
+      name VARCHAR(64) PRIMARY KEY,
+      wert BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+
+def upgrade(cur):
+    for ddl in TABLES:
+        cur.execute(ddl)
+    ward_stats.rebuild(cur)
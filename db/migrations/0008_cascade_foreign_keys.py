@@ -0,0 +1,46 @@
+# nimmt/behandelt: Foreign Keys mit ON DELETE CASCADE
+# (Löschen eines Patienten/Arztes/Medikaments nimmt die Beziehungen mit)
+import re
+
+from db import DB_BACKEND
+from migrations import rebuild_sqlite_table
+
+TABLES = ["nimmt", "behandelt"]
+
+
+def upgrade(cur):
+    for table in TABLES:
+        if DB_BACKEND == "sqlite":
+            _cascade_sqlite(cur, table)
+        else:
+            _cascade_mysql(cur, table)
+
+
+def _cascade_mysql(cur, table):
+    cur.execute("""
+        SELECT k.constraint_name, k.column_name, k.referenced_table_name,
+               k.referenced_column_name, r.delete_rule
+        FROM information_schema.key_column_usage k
+        JOIN information_schema.referential_constraints r
+          ON r.constraint_schema = k.constraint_schema AND r.constraint_name = k.constraint_name
+        WHERE k.table_schema = DATABASE() AND k.table_name = %s
+          AND k.referenced_table_name IS NOT NULL
+    """, (table,))
+    for name, column, ref_table, ref_column, delete_rule in cur.fetchall():
+        if delete_rule == "CASCADE":
+            continue
+        cur.execute(f"ALTER TABLE `{table}` DROP FOREIGN KEY `{name}`")
+        cur.execute(
+            f"ALTER TABLE `{table}` ADD CONSTRAINT `{name}` FOREIGN KEY (`{column}`) "
+            f"REFERENCES `{ref_table}` (`{ref_column}`) ON DELETE CASCADE"
+        )
+
+
+def _cascade_sqlite(cur, table):
+    # SQLite kann Foreign Keys nicht ändern -> Tabelle neu anlegen und umkopieren
+    def transform(ddl):
+        if "ON DELETE CASCADE" in ddl.upper():
+            return ddl
+        return re.sub(r"(REFERENCES\s+[`\"]?\w+[`\"]?\s*\([^)]*\))", r"\1 ON DELETE CASCADE", ddl)
+
+    rebuild_sqlite_table(cur, table, transform)
@@ -0,0 +1,10 @@
+-- Fortschritt der CSV-Imports (csv_import.py): pro Job die Anzahl
+-- Datenzeilen, die schon committet sind -> Wiederaufnahme nach Abbruch
+
+CREATE TABLE IF NOT EXISTS import_lauf (
+  name VARCHAR(255) PRIMARY KEY,
+  tabelle VARCHAR(64) NOT NULL,
+  zeilen INT NOT NULL DEFAULT 0,
+  eingefuegt INT NOT NULL DEFAULT 0,
+  fehler INT NOT NULL DEFAULT 0
+);
@@ -1,19 +1,31 @@
 from flask import jsonify
-from flask import Flask, redirect, render_template, request, url_for
+from flask import Flask, Response, abort, redirect, render_template, request, stream_with_context, url_for
 from dotenv import load_dotenv
 import os
 import git
 import hmac
 import hashlib
-from db import db_read, db_write
-from auth import login_manager, authenticate, register_user
+import csv
+import datetime
+import decimal
+import functools
+import io
+import json
+import time
+import db
+import metrics
+from advisor import register_query
+from patient_history import write_history
+import csv_import
+import ward_stats
+from db import SEARCH_COLUMNS, cached_read_many, db_read, db_read_iter, db_read_page, db_search, db_write, read_many, transaction
+from auth import login_manager, authenticate, register_user, user_cache_stats
+from hashing import HashingBusy, hashing_stats
 from flask_login import login_user, logout_user, login_required, current_user
-import logging
+from logsetup import setup_logging
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-)
+# Logging über Queue + Listener-Thread, Levels aus LOG_LEVEL / LOG_LEVELS
+setup_logging()
 
 # Load .env variables
 load_dotenv()
@@ -27,12 +39,21 @@ app.secret_key = "supersecret"
 # Init auth
 login_manager.init_app(app)
 
-# Init DB schema + seed (SAFE)
+# Init DB (request-scoped Connection, falls DB_REQUEST_SCOPED_CONN=1)
+db.init_app(app)
+
+# DB-Schema prüfen (EINE Query). Ausstehende Migrationen werden beim Start
+# angewendet (nach einem Webhook-Deploy gibt es keinen Konsolen-Schritt);
+# mit DB_AUTO_MIGRATE=0 startet die App bei veraltetem Schema nicht, statt
+# später mit 500 auf fehlenden Tabellen zu scheitern.
+import migrations
 try:
-    from db import init_schema_and_seed
-    init_schema_and_seed()
+    schema_current = migrations.check_schema(auto_upgrade=os.getenv("DB_AUTO_MIGRATE", "1") == "1")
 except Exception as e:
-    print("⚠️ init_schema_and_seed crashed:", repr(e))
+    print("⚠️ Schema-Check fehlgeschlagen:", repr(e))
+    schema_current = None
+if schema_current is False:
+    raise RuntimeError("DB-Schema veraltet: 'python migrations.py upgrade' ausführen oder DB_AUTO_MIGRATE=1 setzen")
 
 # DON'T CHANGE
 def is_valid_signature(x_hub_signature, data, private_key):
@@ -54,23 +75,33 @@ def webhook():
     return 'Unathorized', 401
 
 # Auth routes
+# Antwort, wenn der Hash-Pool voll ist (siehe hashing.py)
+BUSY_MESSAGE = "Gerade melden sich sehr viele an – bitte in ein paar Sekunden nochmal versuchen."
+BUSY_RETRY_AFTER = 2
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     error = None
+    status = 200
 
     if request.method == "POST":
-        user = authenticate(
-            request.form["username"],
-            request.form["password"]
-        )
+        try:
+            user = authenticate(
+                request.form["username"],
+                request.form["password"]
+            )
+        except HashingBusy:
+            user = None
+            error = BUSY_MESSAGE
+            status = 503
 
         if user:
             login_user(user)
             return redirect(url_for("index"))
 
-        error = "Benutzername oder Passwort ist falsch."
+        error = error or "Benutzername oder Passwort ist falsch."
 
-    return render_template(
+    resp = app.make_response((render_template(
         "auth.html",
         title="In dein Konto einloggen",
         action=url_for("login"),
@@ -79,24 +110,33 @@ def login():
         footer_text="Noch kein Konto?",
         footer_link_url=url_for("register"),
         footer_link_label="Registrieren"
-    )
+    ), status))
+    if status == 503:
+        resp.headers["Retry-After"] = str(BUSY_RETRY_AFTER)
+    return resp
 
 
 @app.route("/register", methods=["GET", "POST"])
 def register():
     error = None
+    status = 200
 
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
 
-        ok = register_user(username, password)
+        try:
+            ok = register_user(username, password)
+        except HashingBusy:
+            ok = False
+            error = BUSY_MESSAGE
+            status = 503
         if ok:
             return redirect(url_for("login"))
 
-        error = "Benutzername existiert bereits."
+        error = error or "Benutzername existiert bereits."
 
-    return render_template(
+    resp = app.make_response((render_template(
         "auth.html",
         title="Neues Konto erstellen",
         action=url_for("register"),
@@ -105,7 +145,10 @@ def register():
         footer_text="Du hast bereits ein Konto?",
         footer_link_url=url_for("login"),
         footer_link_label="Einloggen"
-    )
+    ), status))
+    if status == 503:
+        resp.headers["Retry-After"] = str(BUSY_RETRY_AFTER)
+    return resp
 
 @app.route("/logout")
 def logout():
@@ -122,62 +165,203 @@ def db_viz():
     """
     return render_template("db_viz.html")
 
-@app.route("/db_viz/data")
-def db_viz_data():
+# Alle Knoten + Kanten in EINEM Round-Trip. (grp, k1, k2) ist eindeutig ->
+# feste Reihenfolge, gleiche Daten ergeben denselben Body und ETag.
+DB_VIZ_SQL = """
+    SELECT 1 AS grp, CAST(id AS CHAR) AS k1, NULL AS k2, username AS label FROM users
+    UNION ALL
+    SELECT 2, CAST(id AS CHAR), CAST(user_id AS CHAR), content FROM todos
+    UNION ALL
+    SELECT 3, CAST(patientennummer AS CHAR), NULL, name FROM patient
+    UNION ALL
+    SELECT 4, CAST(`ärztenummer` AS CHAR), NULL, name FROM arzt
+    UNION ALL
+    SELECT 5, fachname, NULL, fachname FROM medizin
+    UNION ALL
+    SELECT 6, CAST(patientennummer AS CHAR), CAST(`ärztenummer` AS CHAR), NULL FROM behandelt
+    UNION ALL
+    SELECT 7, CAST(patientennummer AS CHAR), fachname, NULL FROM nimmt
+    ORDER BY grp, k1, k2
+"""
+DB_VIZ_TABLES = ["users", "todos", "patient", "arzt", "medizin", "behandelt", "nimmt"]
+# Fallback, falls die DB von aussen (z.B. MySQL-Konsole) geändert wird
+DB_VIZ_CACHE_TTL = float(os.getenv("DB_VIZ_CACHE_TTL", "60"))
+
+# (versions, expires_at, etag, body)
+_db_viz_cache = None
+
+def build_db_viz_classes():
     classes = []
+    for r in db_read(DB_VIZ_SQL):
+        grp, k1, k2, label = r["grp"], r["k1"], r["k2"], r["label"]
+
+        if grp == 1:
+            classes.append({"name": f"users.{k1}", "label": label or f"user{k1}", "imports": []})
+        elif grp == 2:
+            content = label or ""
+            label = (content[:50] + "...") if len(content) > 50 else content
+            entry = {"name": f"todos.{k1}", "label": label, "imports": []}
+            if k2 is not None:
+                entry["imports"] = [f"users.{k2}"]
+            classes.append(entry)
+        elif grp == 3:
+            classes.append({"name": f"patient.{k1}", "label": label, "imports": []})
+        elif grp == 4:
+            classes.append({"name": f"arzt.{k1}", "label": label, "imports": []})
+        elif grp == 5:
+            classes.append({"name": f"medizin.{k1}", "label": label, "imports": []})
+        elif grp == 6:
+            classes.append({
+                "name": f"link.patient_arzt.{k1}.{k2}",
+                "label": "",
+                "imports": [f"patient.{k1}", f"arzt.{k2}"]
+            })
+        elif grp == 7:
+            classes.append({
+                "name": f"link.patient_med.{k1}.{k2}",
+                "label": "",
+                "imports": [f"patient.{k1}", f"medizin.{k2}"]
+            })
+
+    return classes
 
-    users = db_read("SELECT id, username FROM users ORDER BY id", ())
-    for u in users:
-        uname = u.get("username") or f"user{u['id']}"
-        classes.append({"name": f"users.{u['id']}", "label": uname, "imports": []})
-
-    todos = db_read("SELECT id, user_id, content, due FROM todos ORDER BY id", ())
-    for t in todos:
-        content = t.get("content") or ""
-        label = (content[:50] + "...") if len(content) > 50 else content
-        import_to = f"users.{t['user_id']}" if t.get("user_id") is not None else None
-
-        entry = {"name": f"todos.{t['id']}", "label": label, "imports": []}
-        if import_to:
-            entry["imports"] = [import_to]
-        classes.append(entry)
-
-    patients = db_read("SELECT patientennummer, name FROM patient ORDER BY patientennummer", ())
-    for p in patients:
-        classes.append({"name": f"patient.{p['patientennummer']}", "label": p["name"], "imports": []})
-
-    doctors = db_read("SELECT `ärztenummer`, name FROM arzt ORDER BY `ärztenummer`", ())
-    for d in doctors:
-        classes.append({"name": f"arzt.{d['ärztenummer']}", "label": d["name"], "imports": []})
-
-    meds = db_read("SELECT fachname FROM medizin ORDER BY fachname", ())
-    for m in meds:
-        classes.append({"name": f"medizin.{m['fachname']}", "label": m["fachname"], "imports": []})
-
-    behandelt = db_read("SELECT patientennummer, `ärztenummer` FROM behandelt", ())
-    for b in behandelt:
-        classes.append({
-            "name": f"link.patient_arzt.{b['patientennummer']}.{b['ärztenummer']}",
-            "label": "",
-            "imports": [f"patient.{b['patientennummer']}", f"arzt.{b['ärztenummer']}"]
-        })
-
-    nimmt = db_read("SELECT patientennummer, fachname FROM nimmt", ())
-    for n in nimmt:
-        classes.append({
-            "name": f"link.patient_med.{n['patientennummer']}.{n['fachname']}",
-            "label": "",
-            "imports": [f"patient.{n['patientennummer']}", f"medizin.{n['fachname']}"]
-        })
-
-    return jsonify({"classes": classes})
+@app.route("/db_viz/data")
+def db_viz_data():
+    global _db_viz_cache
+
+    versions = tuple(db.table_version(t) for t in DB_VIZ_TABLES)
+    cached = _db_viz_cache
+    if cached is None or cached[0] != versions or cached[1] < time.monotonic():
+        body = json.dumps({"classes": build_db_viz_classes()}, ensure_ascii=False).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        cached = (versions, time.monotonic() + DB_VIZ_CACHE_TTL, etag, body)
+        _db_viz_cache = cached
+
+    resp = Response(cached[3], mimetype="application/json")
+    resp.set_etag(cached[2])
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+# Pagination: ?after=<token> bzw. ?before=<token>
+def page_args(source=None):
+    source = source if source is not None else request.args
+    return {
+        "after": source.get("after") or None,
+        "before": source.get("before") or None,
+    }
+
+@app.errorhandler(db.InvalidCursor)
+def invalid_cursor(e):
+    # manipulierte/abgeschnittene Links: 400 statt 500
+    return "Ungültiger Seiten-Link (after/before).", 400
+
+# Conditional GET für die Listen-Seiten: ETag/Last-Modified kommen aus den
+# Tabellen-Versionen (db.bump_table_version im Write-Pfad). Stimmt der ETag
+# des Clients, gibt es 304 ohne eine einzige Query.
+LIST_CACHE_CONTROL = os.getenv("LIST_CACHE_CONTROL", "private, no-cache")
+# Versionen sind pro Prozess; bei mehreren Workern (und nach CLI-Writes)
+# sieht ein Worker die Writes der anderen nicht. Nach LIST_ETAG_TTL Sekunden
+# wird daher neu gerendert -> ohne dieses Fenster wären 304 beliebig alt.
+LIST_ETAG_TTL = int(os.getenv("LIST_ETAG_TTL", "60"))
+if LIST_ETAG_TTL <= 0:
+    raise RuntimeError("LIST_ETAG_TTL muss > 0 sein")
+# Pro Route überschreibbar: app.config["CACHE_CONTROL"]["patients_list"] = "..."
+app.config.setdefault("CACHE_CONTROL", {})
+
+def conditional(*tables, cache_control=None):
+    # tables kann auch EINE Funktion sein: fn(**view_args) -> [tabellen]
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            names = tables[0](**kwargs) if len(tables) == 1 and callable(tables[0]) else tables
+            versions = [db.table_version(t) for t in names]
+            window = int(time.time() // LIST_ETAG_TTL)
+            etag = hashlib.sha1(
+                f"{db.STARTED_AT}:{window}:{versions}:{request.full_path}".encode("utf-8")
+            ).hexdigest()
+            # wie beim ETag: spätestens mit jedem neuen Fenster gilt die
+            # Seite als geändert (Writes anderer Worker sieht man hier nicht)
+            last_modified = max(int(max(db.table_changed_at(t) for t in names)), window * LIST_ETAG_TTL)
+            directive = app.config["CACHE_CONTROL"].get(
+                view.__name__, cache_control or LIST_CACHE_CONTROL
+            )
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and since.timestamp() >= last_modified
+
+            if not_modified:
+                resp = Response(status=304)
+            else:
+                resp = app.make_response(view(*args, **kwargs))
+            resp.set_etag(etag)
+            resp.last_modified = last_modified
+            resp.headers["Cache-Control"] = directive
+            return resp
+        return wrapper
+    return decorator
+
+@app.get("/db/pool")
+def db_pool_stats():
+    return jsonify(db.pool_stats())
+
+@app.get("/db/user_cache")
+def db_user_cache_stats():
+    return jsonify(user_cache_stats())
+
+@app.get("/auth/hashing")
+def auth_hashing_stats():
+    return jsonify(hashing_stats())
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# Hot Queries (werden von advisor.py mit EXPLAIN geprüft)
+TODOS_LIST_SQL = register_query(
+    "index_todos", "SELECT id, content, due FROM todos ORDER BY due"
+)
+TODO_COMPLETE_SQL = register_query(
+    "complete_todo", "DELETE FROM todos WHERE user_id=%s AND id=%s", (1, 1)
+)
+NIMMT_LIST_SQL = """
+        SELECT
+          n.patientennummer,
+          p.name AS patient_name,
+          n.fachname,
+          m.dosierung
+        FROM nimmt n
+        LEFT JOIN patient p ON p.patientennummer = n.patientennummer
+        LEFT JOIN medizin m ON m.fachname = n.fachname
+    """
+register_query("nimmt_list", NIMMT_LIST_SQL + " ORDER BY n.patientennummer, n.fachname LIMIT 51")
+BEHANDELT_LIST_SQL = """
+        SELECT
+          b.patientennummer,
+          p.name AS patient_name,
+          b.`ärztenummer`,
+          a.name AS arzt_name,
+          a.spezialisierung
+        FROM behandelt b
+        LEFT JOIN patient p ON p.patientennummer = b.patientennummer
+        LEFT JOIN arzt a ON a.`ärztenummer` = b.`ärztenummer`
+    """
+register_query("behandelt_list", BEHANDELT_LIST_SQL + " ORDER BY b.patientennummer, b.`ärztenummer` LIMIT 51")
+# patient.bettnummer <-> aktuellerAufenthalt.bettnummer
+register_query("patient_aufenthalt", """
+    SELECT p.patientennummer, p.name, a.pflegebedarf, a.anfangsdatum
+    FROM aktuellerAufenthalt a
+    JOIN patient p ON p.bettnummer = a.bettnummer
+""")
 
 # App routes
 @app.route("/", methods=["GET", "POST"])
 def index():
     # GET
     if request.method == "GET":
-        todos = db_read("SELECT id, content, due FROM todos ORDER BY due")
+        todos = db_read(TODOS_LIST_SQL)
         return render_template("main_page.html", todos=todos)
 
     # POST
@@ -189,13 +373,18 @@ def index():
 @app.post("/complete")
 def complete():
     todo_id = request.form.get("id")
-    db_write("DELETE FROM todos WHERE user_id=%s AND id=%s", (current_user.id, todo_id,))
+    db_write(TODO_COMPLETE_SQL, (current_user.id, todo_id,))
     return redirect(url_for("index"))
 
 @app.route("/users", methods=["GET"])
+@conditional("users")
 def users():
-    users = db_read("SELECT username FROM users ORDER BY username", ())
-    return render_template("users.html", users=users)
+    page = db_read_page(
+        "SELECT username FROM users",
+        [("username", "username")],
+        **page_args()
+    )
+    return render_template("users.html", users=page["rows"], page=page)
 
 @app.route("/erfassen", methods=["GET", "POST"])
 def erfassen():
@@ -217,13 +406,17 @@ def erfassen():
                 ehemalige_medikamente = request.form.get("ehemalige_medikamente", "")
                 bettnummer = int(request.form["bettnummer"])
 
-                db_write("""
-                    INSERT INTO patient
-                    (patientennummer, `alter`, name, krankenkasse, krankheiten,
-                     `ehemalige aufenthalte`, `ehemalige medikamente`, bettnummer)
-                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-                """, (patientennummer, alter, name, krankenkasse, krankheiten,
-                      ehemalige_aufenthalte, ehemalige_medikamente, bettnummer))
+                with transaction() as tx:
+                    tx.write("""
+                        INSERT INTO patient
+                        (patientennummer, `alter`, name, krankenkasse, krankheiten,
+                         `ehemalige aufenthalte`, `ehemalige medikamente`, bettnummer)
+                        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+                    """, (patientennummer, alter, name, krankenkasse, krankheiten,
+                          ehemalige_aufenthalte, ehemalige_medikamente, bettnummer))
+                    # Vorgeschichte strukturiert ablegen
+                    write_history(tx, patientennummer, ehemalige_aufenthalte, ehemalige_medikamente)
+                    ward_stats.patient_added(tx)
 
                 message = "✅ Patient gespeichert!"
 
@@ -270,43 +463,68 @@ def erfassen():
                 patientennummer = int(request.form["patientennummer"])
                 aerztenummer = int(request.form["aerztenummer"])
 
-                db_write("""
-                    INSERT INTO behandelt (patientennummer, `ärztenummer`)
-                    VALUES (%s,%s)
-                """, (patientennummer, aerztenummer))
+                with transaction() as tx:
+                    tx.write("""
+                        INSERT INTO behandelt (patientennummer, `ärztenummer`)
+                        VALUES (%s,%s)
+                    """, (patientennummer, aerztenummer))
+                    ward_stats.behandelt_added(tx, aerztenummer)
 
                 message = "✅ Beziehung 'behandelt' gespeichert!"
 
         except Exception as e:
             error = f"❌ Fehler: {e}"
 
-    # Für Dropdowns (praktisch):
-    patients = db_read("SELECT patientennummer, name FROM patient ORDER BY patientennummer", ())
-    doctors = db_read("SELECT `ärztenummer`, name FROM arzt ORDER BY `ärztenummer`", ())
-    meds = db_read("SELECT fachname FROM medizin ORDER BY fachname", ())
+    # Für Dropdowns (praktisch, gecacht bis zur nächsten Änderung, parallel geladen):
+    lookups = cached_read_many({
+        "patients": (["patient"], "SELECT patientennummer, name FROM patient ORDER BY patientennummer"),
+        "doctors": (["arzt"], "SELECT `ärztenummer`, name FROM arzt ORDER BY `ärztenummer`"),
+        "meds": (["medizin"], "SELECT fachname FROM medizin ORDER BY fachname"),
+    })
 
-    return render_template("erfassen.html", message=message, error=error,
-                           patients=patients, doctors=doctors, meds=meds)
+    return render_template("erfassen.html", message=message, error=error, **lookups)
 
 # DB Explorer routes
+
+# Liste aller verfügbaren Tabellen
+AVAILABLE_TABLES = [
+    "patient",
+    "medizin",
+    "arzt",
+    "aktuellerAufenthalt",
+    "nimmt",
+    "behandelt",
+    "ehemaliger_aufenthalt",
+    "ehemaliges_medikament"
+]
+
+# Primärschlüssel pro Tabelle (für Keyset-Pagination)
+TABLE_KEYS = {
+    "patient": [("patientennummer", "patientennummer")],
+    "medizin": [("fachname", "fachname")],
+    "arzt": [("`ärztenummer`", "ärztenummer")],
+    "aktuellerAufenthalt": [("bettnummer", "bettnummer")],
+    "nimmt": [("patientennummer", "patientennummer"), ("fachname", "fachname")],
+    "behandelt": [("patientennummer", "patientennummer"), ("`ärztenummer`", "ärztenummer")],
+    "ehemaliger_aufenthalt": [("id", "id")],
+    "ehemaliges_medikament": [("patientennummer", "patientennummer"), ("fachname", "fachname")],
+}
+
+# Obergrenze für das "limit"-Feld im Explorer (alles darüber -> Export)
+MAX_EXPLORER_LIMIT = 1000
+
 @app.route("/dbexplorer", methods=["GET", "POST"])
 def dbexplorer():
     """
     Interactive database explorer that lets users view any table
     """
-    # Liste aller verfügbaren Tabellen
-    available_tables = [
-        "patient", 
-        "medizin", 
-        "arzt", 
-        "aktuellerAufenthalt",
-        "nimmt",
-        "behandelt"
-    ]
-    
+    available_tables = AVAILABLE_TABLES
+
     selected_table = None
     table_data = []
     columns = []
+    page = None
+    search = None
     error = None
     
     if request.method == "POST":
@@ -320,15 +538,22 @@ def dbexplorer():
             error = "Ungültige Tabelle ausgewählt."
         else:
             try:
-                # Basis-Query
+                limit = max(1, min(int(limit), MAX_EXPLORER_LIMIT))
+
                 if search_column and search_value:
-                    # Mit Suche (LIKE für Textsuche)
-                    sql = f"SELECT * FROM {selected_table} WHERE {search_column} LIKE %s LIMIT {int(limit)}"
-                    table_data = db_read(sql, (f"%{search_value}%",))
+                    # Mit Suche (Volltext-Index, nach Relevanz sortiert)
+                    search = db_search(
+                        selected_table, search_column, search_value,
+                        page=request.form.get("search_page", 0), limit=limit
+                    )
+                    table_data = search["rows"]
                 else:
                     # Ohne Suche
-                    sql = f"SELECT * FROM {selected_table} LIMIT {int(limit)}"
-                    table_data = db_read(sql)
+                    page = db_read_page(
+                        f"SELECT * FROM {selected_table}", TABLE_KEYS[selected_table],
+                        limit=limit, **page_args(request.form)
+                    )
+                    table_data = page["rows"]
                 
                 # Spaltennamen extrahieren
                 if table_data:
@@ -344,24 +569,101 @@ def dbexplorer():
         selected_table=selected_table,
         columns=columns,
         table_data=table_data,
+        page=page,
+        search=search,
+        search_columns={t: list(cols) for t, cols in SEARCH_COLUMNS.items()},
         error=error
     )
 
+@app.get("/dbexplorer/export/<table>")
+def dbexplorer_export(table):
+    """
+    Streamt eine ganze Tabelle als CSV (default) oder NDJSON (?format=ndjson).
+    Die Zeilen werden chunkweise gelesen, der Worker-Speicher bleibt konstant.
+    """
+    if table not in AVAILABLE_TABLES:
+        abort(404)
+
+    fmt = request.args.get("format", "csv")
+    rows = db_read_iter(f"SELECT * FROM `{table}`")
+
+    if fmt == "ndjson":
+        def generate():
+            for row in rows:
+                yield json.dumps(row, default=str, ensure_ascii=False) + "\n"
+
+        mimetype = "application/x-ndjson"
+    elif fmt == "csv":
+        def generate():
+            buf = io.StringIO()
+            writer = None
+            for row in rows:
+                if writer is None:
+                    writer = csv.DictWriter(buf, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+
+        mimetype = "text/csv"
+    else:
+        rows.close()
+        abort(400)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={table}.{fmt}"}
+    )
+
+@app.post("/dbexplorer/import/<table>")
+def dbexplorer_import(table):
+    """
+    CSV-Import (siehe csv_import.py): Datei als Formularfeld "file" oder
+    direkt als Body (text/csv). ?job=<name> speichert den Fortschritt;
+    derselbe Request nach einem Abbruch macht beim letzten Chunk weiter.
+    """
+    if table not in csv_import.IMPORTS:
+        abort(404)
+
+    upload = request.files.get("file")
+    raw = upload.stream if upload else io.BufferedReader(request.stream)
+    fh = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    job = request.values.get("job") or None
+    try:
+        chunk_size = int(request.values.get("chunk_size") or csv_import.IMPORT_CHUNK_SIZE)
+        report = csv_import.import_csv(table, fh, job, max(1, chunk_size))
+    except (csv_import.CsvImportError, UnicodeDecodeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+    finally:
+        fh.detach()
+
+    return jsonify(report.as_dict())
+
 @app.route("/patient/new", methods=["GET", "POST"])
 def new_patient():
     if request.method == "POST":
-        patientennummer = request.form["patientennummer"]
+        patientennummer = int(request.form["patientennummer"])
         alter = request.form["alter"]
         name = request.form["name"]
         krankenkasse = request.form["krankenkasse"]
         krankheiten = request.form.get("krankheiten", "")
-
-        db_write("""
-            INSERT INTO patient
-            (patientennummer, `alter`, name, krankenkasse, krankheiten,
-             `ehemalige aufenthalte`, `ehemalige medikamente`, bettnummer)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (patientennummer, alter, name, krankenkasse, krankheiten, "", "", 0))
+        ehemalige_aufenthalte = request.form.get("ehemalige_aufenthalte", "")
+        ehemalige_medikamente = request.form.get("ehemalige_medikamente", "")
+        bettnummer = int(request.form.get("bettnummer") or 0)
+
+        with transaction() as tx:
+            tx.write("""
+                INSERT INTO patient
+                (patientennummer, `alter`, name, krankenkasse, krankheiten,
+                 `ehemalige aufenthalte`, `ehemalige medikamente`, bettnummer)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+            """, (patientennummer, alter, name, krankenkasse, krankheiten,
+                  ehemalige_aufenthalte, ehemalige_medikamente, bettnummer))
+            # Vorgeschichte strukturiert ablegen
+            write_history(tx, patientennummer, ehemalige_aufenthalte, ehemalige_medikamente)
+            ward_stats.patient_added(tx)
 
         return redirect(url_for("dbexplorer"))
 
@@ -390,11 +692,20 @@ def new_aufenthalt():
         bettnummer = int(request.form["bettnummer"])
         pflegebedarf = request.form["pflegebedarf"]
         anfangsdatum = request.form["anfangsdatum"]  # Format: YYYY-MM-DD
-
-        db_write("""
-            INSERT INTO aktuellerAufenthalt (bettnummer, pflegebedarf, anfangsdatum)
-            VALUES (%s, %s, %s)
-        """, (bettnummer, pflegebedarf, anfangsdatum))
+        try:
+            if anfangsdatum:
+                datetime.date.fromisoformat(anfangsdatum)
+        except ValueError:
+            return render_template(
+                "aufenthalt_new.html", error=f"Ungültiges Anfangsdatum {anfangsdatum!r} (Format: JJJJ-MM-TT)."
+            ), 400
+
+        with transaction() as tx:
+            tx.write("""
+                INSERT INTO aktuellerAufenthalt (bettnummer, pflegebedarf, anfangsdatum)
+                VALUES (%s, %s, %s)
+            """, (bettnummer, pflegebedarf, anfangsdatum))
+            ward_stats.aufenthalt_added(tx, pflegebedarf, anfangsdatum)
 
         return redirect(url_for("dbexplorer"))
 
@@ -414,18 +725,12 @@ def new_nimmt():
         return redirect(url_for("dbexplorer"))
 
     # Daten für Dropdowns laden
-    patients = db_read(
-        "SELECT patientennummer, name FROM patient ORDER BY name"
-    )
-    medikamente = db_read(
-        "SELECT fachname FROM medizin ORDER BY fachname"
-    )
+    lookups = cached_read_many({
+        "patients": (["patient"], "SELECT patientennummer, name FROM patient ORDER BY name"),
+        "medikamente": (["medizin"], "SELECT fachname FROM medizin ORDER BY fachname"),
+    })
 
-    return render_template(
-        "nimmt_new.html",
-        patients=patients,
-        medikamente=medikamente
-    )
+    return render_template("nimmt_new.html", **lookups)
 
 @app.route("/medizin/new", methods=["GET", "POST"])
 def new_medizin():
@@ -448,105 +753,160 @@ def new_behandelt():
         patientennummer = int(request.form["patientennummer"])
         aerztenummer = int(request.form["aerztenummer"])
 
-        db_write("""
-            INSERT INTO behandelt (patientennummer, `ärztenummer`)
-            VALUES (%s, %s)
-        """, (patientennummer, aerztenummer))
+        with transaction() as tx:
+            tx.write("""
+                INSERT INTO behandelt (patientennummer, `ärztenummer`)
+                VALUES (%s, %s)
+            """, (patientennummer, aerztenummer))
+            ward_stats.behandelt_added(tx, aerztenummer)
 
         return redirect(url_for("dbexplorer"))
 
     # Dropdown-Daten laden
-    patients = db_read(
-        "SELECT patientennummer, name FROM patient ORDER BY name"
-    )
-    doctors = db_read(
-        "SELECT `ärztenummer`, name FROM arzt ORDER BY name"
-    )
-
-    return render_template(
-        "behandelt_new.html",
-        patients=patients,
-        doctors=doctors
-    )
+    lookups = cached_read_many({
+        "patients": (["patient"], "SELECT patientennummer, name FROM patient ORDER BY name"),
+        "doctors": (["arzt"], "SELECT `ärztenummer`, name FROM arzt ORDER BY name"),
+    })
+
+    return render_template("behandelt_new.html", **lookups)
+
+# -------- Löschen (einzeln und in Mengen) --------
+# nimmt/behandelt hängen per ON DELETE CASCADE am Patienten, Arzt bzw.
+# Medikament (Migration 0008), die Vorgeschichte nur am Patienten -> es
+# wird nur die Haupttabelle gelöscht, in Chunks von DB_IN_CHUNK_SIZE ids,
+# alles in EINER Transaktion.
+
+# entity -> (tabelle, schlüssel, id-typ, [(kind-tabelle, fk-spalte)], liste)
+DELETE_ENTITIES = {
+    "patient": ("patient", "patientennummer", int, [
+        ("nimmt", "patientennummer"), ("behandelt", "patientennummer"),
+        ("ehemaliger_aufenthalt", "patientennummer"), ("ehemaliges_medikament", "patientennummer"),
+    ], "patients_list"),
+    "arzt": ("arzt", "ärztenummer", int, [("behandelt", "ärztenummer")], "doctors_list"),
+    "medizin": ("medizin", "fachname", str, [("nimmt", "fachname")], "meds_list"),
+}
+BULK_DELETE_MAX = int(os.getenv("BULK_DELETE_MAX", "10000"))
+
+def delete_entities(entity, ids):
+    """Löscht ids samt kaskadierten Beziehungen; liefert {tabelle: gelöschte zeilen}."""
+    table, key, _, children, _ = DELETE_ENTITIES[entity]
+    ids = list(dict.fromkeys(ids))
+    deleted = {}
+    with transaction() as tx:
+        # vorher zählen: rowcount enthält die kaskadierten Zeilen nicht
+        for child, column in children:
+            rows = tx.read_in(f"SELECT COUNT(*) AS n FROM `{child}` WHERE `{column}` IN {{ids}}", ids)
+            deleted[child] = sum(row["n"] for row in rows)
+
+        if entity == "patient":
+            ward_stats.patients_removed(tx, ids)
+        elif entity == "arzt":
+            ward_stats.aerzte_removed(tx, ids)
+
+        deleted[table] = tx.write_in(f"DELETE FROM `{table}` WHERE `{key}` IN {{ids}}", ids)
+        if entity == "patient" and deleted[table]:
+            ward_stats.patient_removed(tx, deleted[table])
+
+        # Versionen (Listen-Cache, ETags) auch für die kaskadierten Tabellen erhöhen
+        tx.tables.update(child for child, n in deleted.items() if n)
+    return deleted
+
+def _delete_ids(id_type):
+    # JSON {"ids": [...]}, mehrere Formularfelder "ids" oder (nur Zahlen) "1,2,3"
+    if request.is_json:
+        values = (request.get_json(silent=True) or {}).get("ids") or []
+    elif id_type is int:
+        values = [v for field in request.form.getlist("ids") for v in field.split(",")]
+    else:
+        values = request.form.getlist("ids")
+    return [id_type(v.strip() if isinstance(v, str) else v) for v in values if str(v).strip()]
+
+def _wants_json():
+    return request.is_json or request.accept_mimetypes.best == "application/json"
+
+@app.post("/<any(patient, arzt, medizin):entity>/delete_many")
+def delete_many(entity):
+    _, _, id_type, _, list_endpoint = DELETE_ENTITIES[entity]
+    try:
+        ids = _delete_ids(id_type)
+    except (TypeError, ValueError):
+        if _wants_json():
+            return jsonify(error="ids müssen Zahlen sein"), 400
+        abort(400)
+    if len(ids) > BULK_DELETE_MAX:
+        return jsonify(error=f"Höchstens {BULK_DELETE_MAX} ids pro Request"), 400
+
+    deleted = delete_entities(entity, ids) if ids else {}
+    if _wants_json():
+        return jsonify(deleted=deleted)
+    return redirect(url_for(list_endpoint))
 
 @app.post("/patient/delete")
 def delete_patient():
     patientennummer = request.form.get("patientennummer")
 
-    if not patientennummer:
-        return redirect(url_for("patients_list"))
-
-    # 1) Beziehungen zuerst löschen (wegen Foreign Keys)
-    db_write("DELETE FROM nimmt WHERE patientennummer=%s", (patientennummer,))
-    db_write("DELETE FROM behandelt WHERE patientennummer=%s", (patientennummer,))
-
-    # 2) Patient löschen
-    db_write("DELETE FROM patient WHERE patientennummer=%s", (patientennummer,))
+    if patientennummer:
+        delete_entities("patient", [patientennummer])
 
     return redirect(url_for("patients_list"))
 
 @app.get("/patient")
+@conditional("patient")
 def patients_list():
-    patients = db_read(
-        "SELECT patientennummer, name, `alter`, krankenkasse, bettnummer FROM patient ORDER BY patientennummer"
+    page = db_read_page(
+        "SELECT patientennummer, name, `alter`, krankenkasse, bettnummer FROM patient",
+        [("patientennummer", "patientennummer")],
+        **page_args()
     )
-    return render_template("patients_list.html", patients=patients)
+    return render_template("patients_list.html", patients=page["rows"], page=page)
 
 @app.post("/arzt/delete")
 def delete_arzt():
     aerztenummer = request.form.get("aerztenummer")
 
-    if not aerztenummer:
-        return redirect(url_for("doctors_list"))
-
-    # 1) Beziehungen zuerst löschen (wegen Foreign Keys)
-    db_write("DELETE FROM behandelt WHERE `ärztenummer`=%s", (aerztenummer,))
-
-    # 2) Arzt löschen
-    db_write("DELETE FROM arzt WHERE `ärztenummer`=%s", (aerztenummer,))
+    if aerztenummer:
+        delete_entities("arzt", [aerztenummer])
 
     return redirect(url_for("doctors_list"))
 
 @app.get("/arzt")
+@conditional("arzt")
 def doctors_list():
-    doctors = db_read(
-        "SELECT `ärztenummer`, name, spezialisierung, anstellzeit FROM arzt ORDER BY `ärztenummer`"
+    page = db_read_page(
+        "SELECT `ärztenummer`, name, spezialisierung, anstellzeit FROM arzt",
+        [("`ärztenummer`", "ärztenummer")],
+        **page_args()
     )
-    return render_template("doctors_list.html", doctors=doctors)
+    return render_template("doctors_list.html", doctors=page["rows"], page=page)
 
 @app.get("/medizin")
+@conditional("medizin")
 def meds_list():
-    meds = db_read("SELECT fachname, dosierung FROM medizin ORDER BY fachname")
-    return render_template("meds_list.html", meds=meds)
+    page = db_read_page(
+        "SELECT fachname, dosierung FROM medizin",
+        [("fachname", "fachname")],
+        **page_args()
+    )
+    return render_template("meds_list.html", meds=page["rows"], page=page)
 
 @app.post("/medizin/delete")
 def delete_medizin():
     fachname = request.form.get("fachname")
-    if not fachname:
-        return redirect(url_for("meds_list"))
 
-    # Beziehungen zuerst löschen (nimmt referenziert medizin.fachname)
-    db_write("DELETE FROM nimmt WHERE fachname=%s", (fachname,))
-
-    # Medikament löschen
-    db_write("DELETE FROM medizin WHERE fachname=%s", (fachname,))
+    if fachname:
+        delete_entities("medizin", [fachname])
 
     return redirect(url_for("meds_list"))
 
 @app.get("/nimmt")
+@conditional("nimmt", "patient", "medizin")
 def nimmt_list():
-    rows = db_read("""
-        SELECT
-          n.patientennummer,
-          p.name AS patient_name,
-          n.fachname,
-          m.dosierung
-        FROM nimmt n
-        LEFT JOIN patient p ON p.patientennummer = n.patientennummer
-        LEFT JOIN medizin m ON m.fachname = n.fachname
-        ORDER BY n.patientennummer, n.fachname
-    """)
-    return render_template("nimmt_list.html", rows=rows)
+    page = db_read_page(
+        NIMMT_LIST_SQL,
+        [("n.patientennummer", "patientennummer"), ("n.fachname", "fachname")],
+        **page_args()
+    )
+    return render_template("nimmt_list.html", rows=page["rows"], page=page)
 
 @app.post("/nimmt/delete")
 def delete_nimmt():
@@ -563,20 +923,14 @@ def delete_nimmt():
     return redirect(url_for("nimmt_list"))
 
 @app.get("/behandelt")
+@conditional("behandelt", "patient", "arzt")
 def behandelt_list():
-    rows = db_read("""
-        SELECT
-          b.patientennummer,
-          p.name AS patient_name,
-          b.`ärztenummer`,
-          a.name AS arzt_name,
-          a.spezialisierung
-        FROM behandelt b
-        LEFT JOIN patient p ON p.patientennummer = b.patientennummer
-        LEFT JOIN arzt a ON a.`ärztenummer` = b.`ärztenummer`
-        ORDER BY b.patientennummer, b.`ärztenummer`
-    """)
-    return render_template("behandelt_list.html", rows=rows)
+    page = db_read_page(
+        BEHANDELT_LIST_SQL,
+        [("b.patientennummer", "patientennummer"), ("b.`ärztenummer`", "ärztenummer")],
+        **page_args()
+    )
+    return render_template("behandelt_list.html", rows=page["rows"], page=page)
 
 @app.post("/behandelt/delete")
 def delete_behandelt():
@@ -586,20 +940,22 @@ def delete_behandelt():
     if not patientennummer or not aerztenummer:
         return redirect(url_for("behandelt_list"))
 
-    db_write(
-        "DELETE FROM behandelt WHERE patientennummer=%s AND `ärztenummer`=%s",
-        (patientennummer, aerztenummer)
-    )
+    with transaction() as tx:
+        if tx.write(
+            "DELETE FROM behandelt WHERE patientennummer=%s AND `ärztenummer`=%s",
+            (patientennummer, aerztenummer)
+        ):
+            ward_stats.behandelt_removed(tx, aerztenummer)
     return redirect(url_for("behandelt_list"))
 
 @app.get("/aufenthalt")
+@conditional("aktuellerAufenthalt")
 def aufenthalt_list():
-    rows = db_read("""
+    page = db_read_page("""
         SELECT bettnummer, pflegebedarf, anfangsdatum
         FROM aktuellerAufenthalt
-        ORDER BY bettnummer
-    """)
-    return render_template("aufenthalt_list.html", rows=rows)
+    """, [("bettnummer", "bettnummer")], **page_args())
+    return render_template("aufenthalt_list.html", rows=page["rows"], page=page)
 
 @app.post("/aufenthalt/delete")
 def delete_aufenthalt():
@@ -607,8 +963,140 @@ def delete_aufenthalt():
     if not bettnummer:
         return redirect(url_for("aufenthalt_list"))
 
-    db_write("DELETE FROM aktuellerAufenthalt WHERE bettnummer=%s", (bettnummer,))
+    with transaction() as tx:
+        row = tx.read(
+            "SELECT pflegebedarf, anfangsdatum FROM aktuellerAufenthalt WHERE bettnummer=%s",
+            (bettnummer,), single=True
+        )
+        # nur zählen, wenn WIR die Zeile gelöscht haben
+        if row and tx.write("DELETE FROM aktuellerAufenthalt WHERE bettnummer=%s", (bettnummer,)):
+            ward_stats.aufenthalt_removed(tx, row["pflegebedarf"], row["anfangsdatum"])
     return redirect(url_for("aufenthalt_list"))
 
+# Stations-Statistik: liest nur die vorberechneten stat_*-Tabellen (siehe ward_stats.py)
+@app.get("/stats")
+@conditional(*ward_stats.STAT_TABLES, "arzt")
+def stats():
+    data = read_many({
+        "levels": "SELECT pflegebedarf, betten, datum_anzahl, datum_summe FROM stat_pflegebedarf ORDER BY pflegebedarf",
+        "doctors": """
+            SELECT s.`ärztenummer`, a.name, s.patienten
+            FROM stat_arzt s
+            LEFT JOIN arzt a ON a.`ärztenummer` = s.`ärztenummer`
+            ORDER BY s.patienten DESC
+            LIMIT 50
+        """,
+        "counters": "SELECT name, wert FROM stat_zaehler",
+    })
+    return render_template("stats.html", stats=ward_stats.summarize(**data))
+
+# -------- JSON-API --------
+# GET /api/<entity>?fields=name,alter&limit=100&after=<token>   Keyset-Pagination
+#     /api/<entity>?ids=1001,1002        Batch-Lookup (zusammengesetzt: 1001:Ibuprofen)
+#     /api/<entity>?since=2026-01-01T00:00:00   nur seither geänderte Zeilen
+# Antwort als Array-of-Arrays, die Spaltennamen stehen nur einmal drin:
+#     {"columns": [...], "rows": [[...], ...], "next": token|null, "prev": token|null}
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# entity -> (tabelle, schlüsselspalten, erlaubte felder)
+API_ENTITIES = {
+    "patient": ("patient", ["patientennummer"], [
+        "patientennummer", "alter", "name", "krankenkasse", "krankheiten",
+        "ehemalige aufenthalte", "ehemalige medikamente", "bettnummer", "geaendert_am",
+    ]),
+    "arzt": ("arzt", ["ärztenummer"], ["ärztenummer", "name", "spezialisierung", "anstellzeit", "geaendert_am"]),
+    "medizin": ("medizin", ["fachname"], ["fachname", "dosierung", "geaendert_am"]),
+    "nimmt": ("nimmt", ["patientennummer", "fachname"], ["patientennummer", "fachname", "geaendert_am"]),
+    "behandelt": ("behandelt", ["patientennummer", "ärztenummer"], ["patientennummer", "ärztenummer", "geaendert_am"]),
+    "aufenthalt": ("aktuellerAufenthalt", ["bettnummer"], ["bettnummer", "pflegebedarf", "anfangsdatum", "geaendert_am"]),
+}
+API_MAX_LIMIT = 1000
+API_MAX_IDS = 500
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+def dumps(data):
+    """Schneller JSON-Serializer (orjson, falls installiert)."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default)
+    return json.dumps(data, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _api_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype="application/json")
+
+def _api_tables(entity):
+    if entity not in API_ENTITIES:
+        abort(404)
+    return [API_ENTITIES[entity][0]]
+
+@app.get("/api/<entity>")
+@conditional(_api_tables)
+def api_list(entity):
+    table, keys, columns = API_ENTITIES[entity]
+
+    fields = [f for f in request.args.get("fields", "").split(",") if f] or columns
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        return _api_response({"error": f"Unbekannte Felder: {', '.join(unknown)}"}, 400)
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", db.PAGE_SIZE)), API_MAX_LIMIT))
+    except ValueError:
+        return _api_response({"error": "limit muss eine Zahl sein"}, 400)
+
+    # Schlüssel werden immer gelesen (für die Cursor), aber nur auf Wunsch ausgegeben
+    select = list(dict.fromkeys(keys + fields))
+    sql = "SELECT " + ", ".join(f"`{c}`" for c in select) + f" FROM `{table}`"
+
+    ids = request.args.get("ids")
+    if ids:
+        wanted = [i.split(":", len(keys) - 1) for i in ids.split(",") if i]
+        if len(wanted) > API_MAX_IDS:
+            return _api_response({"error": f"Höchstens {API_MAX_IDS} ids pro Request"}, 400)
+        if any(len(parts) != len(keys) for parts in wanted):
+            return _api_response({"error": f"ids brauchen {len(keys)} Teile ({':'.join(keys)})"}, 400)
+
+        if len(keys) == 1:
+            where = f"`{keys[0]}` IN ({', '.join(['%s'] * len(wanted))})"
+        else:
+            match = "(" + " AND ".join(f"`{k}` = %s" for k in keys) + ")"
+            where = " OR ".join([match] * len(wanted))
+        rows = db_read(f"{sql} WHERE {where}", [v for parts in wanted for v in parts])
+        page = {"rows": rows, "next": None, "prev": None}
+    else:
+        where, params = None, ()
+        if request.args.get("since"):
+            try:
+                since = datetime.datetime.fromisoformat(request.args["since"])
+            except ValueError:
+                return _api_response({"error": "since muss ein ISO-Zeitpunkt sein"}, 400)
+            # geaendert_am ist DB-Zeit ohne Zeitzone; ein Offset ginge beim
+            # Binden stillschweigend verloren -> lieber ablehnen
+            if since.tzinfo is not None:
+                return _api_response({"error": "since ohne Zeitzone angeben (DB-Zeit, z.B. 2026-01-10T08:00:00)"}, 400)
+            where, params = "geaendert_am > %s", (since,)
+        try:
+            page = db_read_page(
+                sql, [(f"`{k}`", k) for k in keys],
+                where=where, params=params, limit=limit, **page_args()
+            )
+        except db.InvalidCursor:
+            return _api_response({"error": "after/before ist kein gültiges Token"}, 400)
+
+    return _api_response({
+        "columns": fields,
+        "rows": [[row[f] for f in fields] for row in page["rows"]],
+        "next": page["next"],
+        "prev": page["prev"],
+    })
+
 if __name__ == "__main__":
     app.run()
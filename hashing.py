@@ -0,0 +1,163 @@
+"""
+Passwort-Hashing in einem begrenzten Prozess-Pool.
+
+Der KDF (scrypt/pbkdf2) ist absichtlich langsam. Im Request-Thread würde
+ein Schwall von Logins (Schichtwechsel!) alle WSGI-Threads blockieren.
+Hier laufen Hashing und Prüfung in eigenen Prozessen. Sind schon
+PASSWORD_HASH_QUEUE Jobs unterwegs, wird sofort mit HashingBusy abgelehnt
+statt zu warten.
+"""
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# werkzeug-Methode inkl. Parameter, z.B. "scrypt:32768:8:1" oder "pbkdf2:sha256:1000000"
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+HASH_SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+# 0 = im Request-Thread hashen (z.B. für Tests)
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# max. Jobs gleichzeitig (laufend + wartend), danach HashingBusy
+HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", str(max(1, HASH_WORKERS) * 4)))
+# max. Sekunden, die ein Request auf sein Ergebnis wartet
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+HASH_STATS = {"jobs": 0, "rejected": 0, "timeouts": 0, "rehashed": 0}
+_stats_lock = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_QUEUE)
+# belegte Plätze in _slots (unter _stats_lock)
+_in_flight = 0
+
+
+class HashingBusy(Exception):
+    """Pool ausgelastet -> Request sofort ablehnen (503)."""
+
+
+def _count(key):
+    with _stats_lock:
+        HASH_STATS[key] += 1
+
+
+def _release_slot():
+    global _in_flight
+    with _stats_lock:
+        _in_flight -= 1
+    _slots.release()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # "spawn": fork aus einem Prozess mit laufenden Threads kann hängen bleiben
+            _executor = ProcessPoolExecutor(
+                max_workers=HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _run(fn, *args):
+    global _in_flight
+    if HASH_WORKERS <= 0:
+        _count("jobs")
+        return fn(*args)
+
+    if not _slots.acquire(blocking=False):
+        _count("rejected")
+        raise HashingBusy(f"{HASH_QUEUE} Hash-Jobs in Arbeit")
+    with _stats_lock:
+        _in_flight += 1
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _release_slot()
+        raise
+    # der Platz wird erst frei, wenn der Job wirklich fertig ist
+    future.add_done_callback(lambda _: _release_slot())
+    _count("jobs")
+
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        _count("timeouts")
+        raise HashingBusy(f"Hash-Job nach {HASH_TIMEOUT}s nicht fertig")
+    except BrokenProcessPool:
+        logger.exception("Hash-Prozess abgestürzt, Pool wird neu gestartet")
+        _reset_executor()
+        raise
+
+
+def _method_of(pwhash):
+    return pwhash.split("$", 1)[0]
+
+
+@functools.lru_cache(maxsize=None)
+def target_method():
+    # werkzeug ergänzt fehlende Parameter ("scrypt" -> "scrypt:32768:8:1")
+    return _method_of(hash_password(""))
+
+
+def _verify(pwhash, password, method, salt_length, target):
+    # läuft im Worker-Prozess: prüfen und bei Bedarf gleich neu hashen
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if _method_of(pwhash) != target:
+        return True, generate_password_hash(password, method, salt_length)
+    return True, None
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, HASH_METHOD, HASH_SALT_LENGTH)
+
+
+def verify_password(pwhash, password):
+    """
+    Liefert (ok, neuer_hash). neuer_hash ist gesetzt, wenn der gespeicherte
+    Hash mit veralteten KDF-Parametern erzeugt wurde.
+    """
+    ok, new_hash = _run(_verify, pwhash, password, HASH_METHOD, HASH_SALT_LENGTH, target_method())
+    if new_hash:
+        _count("rehashed")
+    return ok, new_hash
+
+
+def hashing_stats():
+    with _stats_lock:
+        stats = dict(HASH_STATS)
+        stats["in_flight"] = _in_flight
+    stats["workers"] = HASH_WORKERS
+    stats["queue"] = HASH_QUEUE
+    return stats
+
+
+def _hashing_collector():
+    stats = hashing_stats()
+    yield "password_hash_jobs_total", "counter", "Hash-/Prüf-Jobs", stats["jobs"]
+    yield "password_hash_rejected_total", "counter", "Wegen vollem Pool abgelehnt", stats["rejected"]
+    yield "password_hash_timeouts_total", "counter", "Jobs über PASSWORD_HASH_TIMEOUT", stats["timeouts"]
+    yield "password_rehashed_total", "counter", "Beim Login neu gehashte Passwörter", stats["rehashed"]
+    yield "password_hash_in_flight", "gauge", "Laufende + wartende Jobs", stats["in_flight"]
+
+metrics.register_collector(_hashing_collector)
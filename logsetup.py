@@ -0,0 +1,157 @@
+"""
+Logging über eine Queue: Request-Threads legen Records nur in eine
+QueueHandler-Queue, formatiert und geschrieben wird im Thread des
+QueueListener. Konfiguration per .env (siehe README):
+
+    LOG_LEVEL=INFO                        # Root-Level
+    LOG_LEVELS=auth=DEBUG,db.slow=WARNING # pro Logger (inkl. Kinder)
+    LOG_DEBUG_SAMPLE=auth=0.01            # nur jedes ~100. DEBUG-Event von auth
+    LOG_FORMAT=json                       # eine JSON-Zeile pro Record
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_DEBUG_SAMPLE = os.getenv("LOG_DEBUG_SAMPLE", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# volle Queue -> Record verwerfen statt den Request zu blockieren
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+LOG_STATS = {"dropped": 0, "sampled_out": 0}
+_stats_lock = threading.Lock()
+_listener = None
+
+
+def _count(key):
+    with _stats_lock:
+        LOG_STATS[key] += 1
+
+
+def _parse_pairs(value):
+    # "auth=DEBUG, db.slow=WARNING" -> {"auth": "DEBUG", "db.slow": "WARNING"}
+    pairs = {}
+    for part in value.split(","):
+        name, sep, setting = part.partition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+class DebugSampler(logging.Filter):
+    """Lässt von DEBUG-Records pro Logger nur den Anteil rate durch."""
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._cache = {}
+
+    def _rate(self, name):
+        rate = self._cache.get(name)
+        if rate is None:
+            # längster passender Prefix: "auth" gilt auch für "auth.session"
+            rate, best = 1.0, -1
+            for prefix, value in self.rates.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > best:
+                    rate, best = value, len(prefix)
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        _count("sampled_out")
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # nur die Nachricht zusammensetzen (Argumente könnten sich noch
+        # ändern); Formatierung inkl. Traceback macht der Listener-Thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count("dropped")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """Ersetzt die Root-Handler durch QueueHandler + Listener (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    rates = {name: float(rate) for name, rate in _parse_pairs(LOG_DEBUG_SAMPLE).items()}
+    if rates:
+        handler.addFilter(DebugSampler(rates))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    # beim Beenden noch alles aus der Queue schreiben
+    atexit.register(_listener.stop)
+
+
+def log_stats():
+    with _stats_lock:
+        stats = dict(LOG_STATS)
+    stats["queued"] = _listener.queue.qsize() if _listener else 0
+    return stats
+
+
+def _log_collector():
+    stats = log_stats()
+    yield "log_records_dropped_total", "counter", "Wegen voller Log-Queue verworfen", stats["dropped"]
+    yield "log_debug_sampled_out_total", "counter", "Durch LOG_DEBUG_SAMPLE verworfene DEBUG-Records", stats["sampled_out"]
+    yield "log_queue_size", "gauge", "Records, die auf den Listener warten", stats["queued"]
+
+metrics.register_collector(_log_collector)
@@ -0,0 +1,164 @@
+import logging
+import os
+import re
+import threading
+
+# Logger für langsame Queries
+logger = logging.getLogger("db.slow")
+
+# Ab so vielen Millisekunden wird ein Statement als "slow" geloggt
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+
+# Bucket-Grenzen in Sekunden (Prometheus-Style, kumulativ)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+_lock = threading.Lock()
+# (op, table) -> Histogram / Zähler
+_query_latency = {}
+_query_rows = {}
+_query_errors = {}
+_conn_wait = Histogram()
+_slow_queries = [0]
+
+# Zusätzliche Hooks: fn(kind, sql, seconds, rows, error)
+_hooks = []
+# Collector liefern (name, typ, hilfe, {labels: wert} | wert)
+_collectors = []
+
+# UPDATE nennt die Tabelle direkt nach dem Verb, alle anderen nach FROM/INTO/TABLE
+_STATEMENT_RE = re.compile(
+    r"^\s*\(?\s*(?:(UPDATE)\s+(?:LOW_PRIORITY\s+|IGNORE\s+)*"
+    r"|(\w+).*?\b(?:FROM|INTO|TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+)`?(\w+)`?",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def statement_label(sql):
+    """Kurzes, stabiles Label für ein Statement, z.B. ("SELECT", "patient")."""
+    m = _STATEMENT_RE.match(sql)
+    if m:
+        return (m.group(1) or m.group(2)).upper(), m.group(3)
+    first = sql.split(None, 1)
+    return (first[0].upper() if first else "?"), "?"
+
+
+def _redact(sql):
+    # Parameter werden nie geloggt, nur das Statement (ohne Zeilenumbrüche)
+    return " ".join(sql.split())
+
+
+def add_query_hook(fn):
+    _hooks.append(fn)
+
+
+def register_collector(fn):
+    _collectors.append(fn)
+
+
+def observe_query(kind, sql, seconds, rows=None, error=None):
+    label = statement_label(sql)
+    with _lock:
+        hist = _query_latency.get(label)
+        if hist is None:
+            hist = _query_latency[label] = Histogram()
+        hist.observe(seconds)
+        if rows is not None and rows >= 0:
+            _query_rows[label] = _query_rows.get(label, 0) + rows
+        if error is not None:
+            _query_errors[label] = _query_errors.get(label, 0) + 1
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        with _lock:
+            _slow_queries[0] += 1
+        logger.warning("slow %s (%.1f ms, rows=%s): %s", kind, seconds * 1000, rows, _redact(sql))
+
+    for hook in _hooks:
+        try:
+            hook(kind, sql, seconds, rows, error)
+        except Exception:
+            logging.getLogger(__name__).exception("query hook failed")
+
+
+def observe_conn_wait(seconds):
+    with _lock:
+        _conn_wait.observe(seconds)
+
+
+# -------- Prometheus Text-Format --------
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _histogram_lines(name, hist, labels=()):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(hist.buckets, hist.counts):
+        cumulative += n
+        lines.append(f"{name}_bucket{_fmt_labels(tuple(labels) + (('le', bound),))} {cumulative}")
+    lines.append(f"{name}_bucket{_fmt_labels(tuple(labels) + (('le', '+Inf'),))} {hist.count}")
+    lines.append(f"{name}_sum{_fmt_labels(labels)} {hist.sum}")
+    lines.append(f"{name}_count{_fmt_labels(labels)} {hist.count}")
+    return lines
+
+
+def render_prometheus():
+    lines = []
+    with _lock:
+        lines.append("# HELP db_query_seconds Latenz pro Statement")
+        lines.append("# TYPE db_query_seconds histogram")
+        for (op, table), hist in sorted(_query_latency.items()):
+            lines.extend(_histogram_lines("db_query_seconds", hist, (("op", op), ("table", table))))
+
+        lines.append("# HELP db_query_rows_total Gelesene/geschriebene Zeilen pro Statement")
+        lines.append("# TYPE db_query_rows_total counter")
+        for (op, table), n in sorted(_query_rows.items()):
+            lines.append(f"db_query_rows_total{_fmt_labels((('op', op), ('table', table)))} {n}")
+
+        lines.append("# HELP db_query_errors_total Fehlgeschlagene Statements")
+        lines.append("# TYPE db_query_errors_total counter")
+        for (op, table), n in sorted(_query_errors.items()):
+            lines.append(f"db_query_errors_total{_fmt_labels((('op', op), ('table', table)))} {n}")
+
+        lines.append("# HELP db_slow_queries_total Statements über DB_SLOW_QUERY_MS")
+        lines.append("# TYPE db_slow_queries_total counter")
+        lines.append(f"db_slow_queries_total {_slow_queries[0]}")
+
+        lines.append("# HELP db_conn_wait_seconds Wartezeit auf eine Connection")
+        lines.append("# TYPE db_conn_wait_seconds histogram")
+        lines.extend(_histogram_lines("db_conn_wait_seconds", _conn_wait))
+
+    for collector in _collectors:
+        for name, kind, help_text, value in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    lines.append(f"{name}{_fmt_labels(labels)} {v}")
+            else:
+                lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,260 @@
+"""
+Versionierte Schema-Migrationen.
+
+Migrationen liegen in db/migrations/ und heissen NNNN_beschreibung.sql oder
+NNNN_beschreibung.py (mit einer Funktion upgrade(cur)). Angewendete
+Versionen werden in der Tabelle schema_migrations festgehalten.
+
+    python migrations.py status     # aktuelle / neueste Version anzeigen
+    python migrations.py upgrade    # alle ausstehenden Migrationen anwenden
+"""
+import importlib.util
+import logging
+import os
+import re
+import sys
+
+from mysql.connector import errors
+
+from db import DB_BACKEND, get_conn
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "migrations")
+
+_FILE_RE = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+# Statements in .sql-Dateien enden mit ";" am Zeilenende
+_STATEMENT_END_RE = re.compile(r";\s*$", re.MULTILINE)
+
+# Verhindert, dass mehrere Worker gleichzeitig migrieren
+_LOCK_NAME = "schema_migrations"
+_LOCK_TIMEOUT = 60
+
+
+def discover():
+    """Liefert [(version, name, pfad)] sortiert nach Version."""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        m = _FILE_RE.match(filename)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    found.sort()
+
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Doppelte Migrationsversion in {MIGRATIONS_DIR}")
+    return found
+
+
+def latest_version():
+    migrations = discover()
+    return migrations[-1][0] if migrations else 0
+
+
+def split_sql(text):
+    # Kommentarzeilen entfernen, dann an ";" am Zeilenende trennen
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith("--")]
+    return [stmt.strip() for stmt in _STATEMENT_END_RE.split("\n".join(lines)) if stmt.strip()]
+
+
+def ensure_index(cur, table, name, ddl):
+    if DB_BACKEND == "sqlite":
+        # FULLTEXT-DDL übersetzt sqlite_backend zu "nichts"
+        cur.execute(ddl.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+        return
+
+    # MySQL kennt kein CREATE INDEX IF NOT EXISTS
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    if not cur.fetchall():
+        cur.execute(ddl)
+
+
+def has_column(cur, table, column):
+    if DB_BACKEND == "sqlite":
+        cur.execute(f"PRAGMA table_info(`{table}`)")
+        return any(row[1] == column for row in cur.fetchall())
+
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+    """, (table, column))
+    return bool(cur.fetchall())
+
+
+_CREATE_TABLE_NAME_RE = re.compile(r"^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[`\"]?\w+[`\"]?", re.IGNORECASE)
+
+
+def rebuild_sqlite_table(cur, table, transform):
+    """
+    SQLite kann Constraints nicht per ALTER TABLE ändern: Tabelle mit
+    transform(ddl) neu anlegen, Daten kopieren, Indexe/Trigger wiederherstellen.
+    Liefert False, wenn transform nichts geändert hat.
+    """
+    cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", (table,))
+    old_ddl = cur.fetchall()[0][0]
+    ddl = transform(old_ddl)
+    if ddl == old_ddl:
+        return False
+    ddl = _CREATE_TABLE_NAME_RE.sub(f"CREATE TABLE `{table}_neu`", ddl, count=1)
+
+    # Indexe und Trigger hängen an der Tabelle -> danach neu anlegen
+    cur.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = %s AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    )
+    dependents = [row[0] for row in cur.fetchall()]
+
+    cur.execute(ddl)
+    cur.execute(f"INSERT INTO `{table}_neu` SELECT * FROM `{table}`")
+    cur.execute(f"DROP TABLE `{table}`")
+    cur.execute(f"ALTER TABLE `{table}_neu` RENAME TO `{table}`")
+    for sql in dependents:
+        cur.execute(sql)
+    return True
+
+
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version INT PRIMARY KEY,
+          name VARCHAR(255) NOT NULL,
+          applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _current_version(cur):
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cur.fetchall()[0][0]
+
+
+def _apply(cur, path):
+    if path.endswith(".sql"):
+        with open(path, encoding="utf-8") as fh:
+            for stmt in split_sql(fh.read()):
+                cur.execute(stmt)
+    else:
+        spec = importlib.util.spec_from_file_location("migration_" + os.path.basename(path)[:-3], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cur)
+
+
+def _installed_version(cur):
+    # nur lesen: fehlt schema_migrations noch, ist nichts angewendet
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_migrations")
+        return cur.fetchall()[0][0] or 0
+    except errors.ProgrammingError:
+        return 0
+
+
+def current_version():
+    conn = get_conn()
+    try:
+        return _installed_version(conn.cursor())
+    finally:
+        conn.close()
+
+
+def _lock(cur):
+    if DB_BACKEND == "sqlite":
+        # Eine Datei, ein Schreiber: SQLite serialisiert selbst
+        return
+    cur.execute("SELECT GET_LOCK(%s, %s)", (_LOCK_NAME, _LOCK_TIMEOUT))
+    if cur.fetchall()[0][0] != 1:
+        raise RuntimeError("Migrations-Lock konnte nicht geholt werden")
+
+
+def _unlock(cur):
+    if DB_BACKEND == "sqlite":
+        return
+    cur.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+    cur.fetchall()
+
+
+def upgrade(target=None):
+    """Wendet alle ausstehenden Migrationen (bis target) an. Liefert die neue Version."""
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        _lock(cur)
+        try:
+            _ensure_table(cur)
+            version = _current_version(cur)
+
+            for number, name, path in discover():
+                if number <= version or (target is not None and number > target):
+                    continue
+                logger.info("Migration %04d_%s wird angewendet", number, name)
+                _apply(cur, path)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (number, name)
+                )
+                conn.commit()
+                version = number
+
+            return version
+        finally:
+            _unlock(cur)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+def check_schema(auto_upgrade=False):
+    """
+    Schneller Check beim Worker-Start: EINE Query auf schema_migrations.
+    Liefert True, wenn das Schema aktuell ist.
+    """
+    latest = latest_version()
+    conn = get_conn()
+    try:
+        version = _installed_version(conn.cursor())
+    finally:
+        conn.close()
+
+    if version >= latest:
+        return True
+
+    if auto_upgrade:
+        upgrade()
+        return True
+
+    logger.warning(
+        "DB-Schema ist auf Version %s, neueste Migration ist %s -> 'python migrations.py upgrade' ausführen",
+        version, latest
+    )
+    return False
+
+
+def main(argv):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    command = argv[1] if len(argv) > 1 else "status"
+
+    if command == "upgrade":
+        target = int(argv[2]) if len(argv) > 2 else None
+        print(f"Schema-Version: {upgrade(target)}")
+    elif command == "status":
+        print(f"Schema-Version: {current_version()} (neueste: {latest_version()})")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
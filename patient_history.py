@@ -0,0 +1,70 @@
+"""
+Vorgeschichte eines Patienten (ehemalige Aufenthalte / Medikamente).
+
+Die Formulare liefern weiterhin Freitext, z.B.
+    "2018: Lungenentzündung; 2019: Bronchitis"   bzw.   "Salbutamol, Ibuprofen"
+Daraus werden strukturierte Zeilen in ehemaliger_aufenthalt und
+ehemaliges_medikament erzeugt.
+"""
+import re
+
+_AUFENTHALT_RE = re.compile(r"^\s*(\d{4})\s*:\s*(.+?)\s*$")
+_SPLIT_RE = re.compile(r"[;,\n]")
+
+
+def parse_aufenthalte(text):
+    """'2018: Lungenentzündung; 2019: Bronchitis' -> [(2018, 'Lungenentzündung'), (2019, 'Bronchitis')]"""
+    result = []
+    for part in (text or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        m = _AUFENTHALT_RE.match(part)
+        if m:
+            result.append((int(m.group(1)), m.group(2)[:255]))
+        else:
+            # ohne Jahr: Diagnose trotzdem übernehmen
+            result.append((None, part[:255]))
+    return result
+
+
+def parse_medikamente(text):
+    """'Salbutamol, Ibuprofen' -> ['Salbutamol', 'Ibuprofen'] (ohne Duplikate)"""
+    result = []
+    for part in _SPLIT_RE.split(text or ""):
+        name = part.strip()[:255]
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+def write_history(tx, patientennummer, aufenthalte_text, medikamente_text):
+    """Schreibt die Vorgeschichte eines Patienten innerhalb einer db.transaction()."""
+    write_history_many(tx, [(patientennummer, aufenthalte_text, medikamente_text)])
+
+
+def write_history_many(tx, patients):
+    """Wie write_history für viele (patientennummer, aufenthalte, medikamente), je ein executemany."""
+    aufenthalte = [
+        (nr, jahr, diagnose)
+        for nr, aufenthalte_text, _ in patients
+        for jahr, diagnose in parse_aufenthalte(aufenthalte_text)
+    ]
+    medikamente = [
+        (nr, name)
+        for nr, _, medikamente_text in patients
+        for name in parse_medikamente(medikamente_text)
+    ]
+
+    if aufenthalte:
+        tx.write_many(
+            "INSERT INTO ehemaliger_aufenthalt (patientennummer, jahr, diagnose) VALUES (%s, %s, %s)",
+            aufenthalte
+        )
+
+    if medikamente:
+        # nur Namen, kein Eintrag im Medikamenten-Katalog (Tippfehler!)
+        tx.write_many(
+            "INSERT IGNORE INTO ehemaliges_medikament (patientennummer, fachname) VALUES (%s, %s)",
+            medikamente
+        )
@@ -0,0 +1,274 @@
+"""
+Eingebettetes SQLite-Backend für db.py (DB_BACKEND=sqlite).
+
+Für Entwicklung, Tests und kleine Single-Node-Installationen ohne
+MySQL-Server. Jeder Thread hat eine eigene Connection (WAL-Modus:
+Leser blockieren den Schreiber nicht). Connections und Cursor bieten die
+Teile der mysql-connector-API, die db.py und migrations.py benutzen;
+SQLite-Fehler werden auf mysql.connector.errors abgebildet, damit
+aufrufender Code unverändert bleibt.
+
+Das Schema bleibt in db/migrations/ (MySQL-Syntax). translate() übersetzt
+die dort verwendete Teilmenge:
+    %s                              -> ?
+    INSERT IGNORE                   -> INSERT OR IGNORE
+    ON DUPLICATE KEY UPDATE a = a   -> INSERT OR IGNORE
+    INT AUTO_INCREMENT PRIMARY KEY  -> INTEGER PRIMARY KEY AUTOINCREMENT
+    INDEX name (...) in CREATE TABLE -> eigenes CREATE INDEX IF NOT EXISTS
+    CREATE FULLTEXT INDEX           -> entfällt (db_search nutzt LIKE)
+"""
+import datetime
+import functools
+import os
+import re
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+from mysql.connector import errors
+
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "app.db")
+# Millisekunden, die auf einen gesperrten Schreib-Lock gewartet wird
+SQLITE_BUSY_TIMEOUT = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000"))
+# Page-Cache pro Connection in MB
+SQLITE_CACHE_MB = int(os.getenv("DB_SQLITE_CACHE_MB", "16"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    # mit WAL ausreichend sicher (nur der letzte Commit kann bei Stromausfall fehlen)
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}",
+    f"PRAGMA cache_size = -{SQLITE_CACHE_MB * 1024}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+)
+
+
+# -------- Datums-Typen wie bei mysql-connector --------
+
+def _convert_date(value):
+    try:
+        return datetime.date.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+def _convert_datetime(value):
+    try:
+        return datetime.datetime.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_datetime)
+
+
+# -------- SQL-Übersetzung --------
+
+_INSERT_IGNORE_RE = re.compile(r"^\s*INSERT\s+IGNORE\s+INTO\b", re.IGNORECASE)
+_NOOP_UPSERT_RE = re.compile(r"\s*ON\s+DUPLICATE\s+KEY\s+UPDATE\s+([`\w]+)\s*=\s*\1\s*$", re.IGNORECASE)
+_INSERT_RE = re.compile(r"^\s*INSERT\s+INTO\b", re.IGNORECASE)
+_AUTO_INCREMENT_RE = re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.IGNORECASE)
+_CREATE_TABLE_RE = re.compile(r"^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?", re.IGNORECASE)
+_INLINE_INDEX_RE = re.compile(r"^\s*(UNIQUE\s+)?(?:INDEX|KEY)\s+`?(\w+)`?\s*(\([^)]*\))\s*,?\s*$", re.IGNORECASE | re.MULTILINE)
+_TRAILING_COMMA_RE = re.compile(r",(\s*\)\s*)$")
+_FULLTEXT_RE = re.compile(r"^\s*CREATE\s+FULLTEXT\s+INDEX\b", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=512)
+def translate(sql):
+    """MySQL-Statement -> Tuple von SQLite-Statements (meist genau eines)."""
+    if _FULLTEXT_RE.match(sql):
+        return ()
+
+    sql = sql.replace("%s", "?")
+    sql = _INSERT_IGNORE_RE.sub("INSERT OR IGNORE INTO", sql)
+    if _NOOP_UPSERT_RE.search(sql):
+        sql = _INSERT_RE.sub("INSERT OR IGNORE INTO", _NOOP_UPSERT_RE.sub("", sql))
+
+    table = _CREATE_TABLE_RE.match(sql)
+    if not table:
+        return (sql,)
+
+    sql = _AUTO_INCREMENT_RE.sub("INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+    indexes = [
+        f"CREATE {unique or ''}INDEX IF NOT EXISTS `{name}` ON `{table.group(1)}` {columns}"
+        for unique, name, columns in _INLINE_INDEX_RE.findall(sql)
+    ]
+    if indexes:
+        sql = _TRAILING_COMMA_RE.sub(r"\1", _INLINE_INDEX_RE.sub("", sql).rstrip())
+    return (sql, *indexes)
+
+
+@contextmanager
+def _mysql_errors():
+    # SQLite-Fehler -> mysql.connector.errors (errno wie bei MySQL)
+    try:
+        yield
+    except sqlite3.IntegrityError as e:
+        msg = str(e)
+        errno = 1452 if "FOREIGN KEY" in msg else 1062 if "UNIQUE" in msg else None
+        raise errors.IntegrityError(msg=msg, errno=errno) from e
+    except sqlite3.OperationalError as e:
+        msg = str(e)
+        if msg.startswith(("no such", "near ")) or "syntax error" in msg:
+            raise errors.ProgrammingError(msg=msg) from e
+        raise errors.OperationalError(msg=msg) from e
+    except sqlite3.Error as e:
+        raise errors.DatabaseError(msg=str(e)) from e
+
+
+class Cursor:
+    """Cursor mit mysql-connector-Verhalten (%s-Parameter, dictionary=True)."""
+    def __init__(self, conn, dictionary=False):
+        self._cur = conn.cursor()
+        self._dictionary = dictionary
+
+    @property
+    def with_rows(self):
+        return self._cur.description is not None
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cur.description or ())
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    def execute(self, sql, params=()):
+        with _mysql_errors():
+            for stmt in translate(sql):
+                self._cur.execute(stmt, tuple(params or ()))
+
+    def executemany(self, sql, seq_params):
+        with _mysql_errors():
+            for stmt in translate(sql):
+                self._cur.executemany(stmt, seq_params)
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        with _mysql_errors():
+            return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        with _mysql_errors():
+            return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        with _mysql_errors():
+            return [self._row(r) for r in self._cur.fetchall()]
+
+    def close(self):
+        self._cur.close()
+
+
+class Connection:
+    """
+    Per-Thread-Connection. Geschachtelte Checkouts im selben Thread teilen
+    sie; erst das letzte close() beendet eine offene Transaktion.
+    """
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self.checkouts = 0
+        # gibt es bei SQLite nicht (Cursor lesen ohnehin lazy)
+        self.unread_result = False
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None):
+        # prepared: sqlite3 cached Statements selbst (cached_statements)
+        return Cursor(self._conn, dictionary=dictionary)
+
+    def commit(self):
+        with _mysql_errors():
+            self._conn.commit()
+
+    def rollback(self):
+        with _mysql_errors():
+            self._conn.rollback()
+
+    def consume_results(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.checkouts -= 1
+        if self.checkouts > 0:
+            return
+        try:
+            # wie der Session-Reset im MySQL-Pool
+            self._conn.rollback()
+        finally:
+            self._pool._release()
+
+
+class SQLitePool:
+    """Gleiche Schnittstelle wie db.ConnectionPool (get_conn, snapshot)."""
+    def __init__(self, name="sqlite", path=SQLITE_PATH):
+        self.name = name
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"checkouts": 0, "waits": 0, "wait_time": 0.0, "timeouts": 0, "broken": 0}
+        self._open = 0
+        self._in_use = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            uri=self.path.startswith("file:"),
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._open += 1
+        wrapper = Connection(self, conn)
+        # Thread beendet -> threading.local gibt die Connection frei
+        weakref.finalize(wrapper, self._closed, conn)
+        return wrapper
+
+    def _closed(self, conn):
+        conn.close()
+        with self._lock:
+            self._open -= 1
+
+    def get_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        conn.checkouts += 1
+        with self._lock:
+            self.stats["checkouts"] += 1
+            if conn.checkouts == 1:
+                self._in_use += 1
+        return conn
+
+    def _release(self):
+        with self._lock:
+            self._in_use -= 1
+
+    def release(self, conn):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = self._open
+            stats["in_use"] = self._in_use
+        return stats
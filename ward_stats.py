@@ -0,0 +1,204 @@
+"""
+Vorberechnete Stations-Statistik: belegte Betten und mittlere
+Aufenthaltsdauer pro Pflegebedarf, Patienten pro Arzt, Gesamtzahlen.
+
+Die Schreib-Routen passen die Tabellen stat_* in DERSELBEN Transaktion
+an wie die eigentliche Änderung (siehe *_added / *_removed). /stats
+liest nur diese Tabellen und nie aktuellerAufenthalt/patient/behandelt.
+
+    python ward_stats.py rebuild    # alles neu aus den Basistabellen berechnen
+"""
+import datetime
+import hashlib
+import sys
+
+from db import bump_table_version, get_conn
+
+STAT_TABLES = ["stat_pflegebedarf", "stat_arzt", "stat_zaehler"]
+
+
+def _day(value):
+    # Anfangsdatum -> Tagesnummer (Summe davon ergibt die mittlere Dauer)
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return value.toordinal()
+
+
+def level_key(pflegebedarf):
+    # pflegebedarf ist TEXT -> als Schlüssel der SHA-1 des vollen Werts
+    # (kein Abschneiden, verschiedene lange Werte bleiben getrennt)
+    return hashlib.sha1((pflegebedarf or "").encode("utf-8")).hexdigest()
+
+
+def _levels(rows):
+    # (pflegebedarf, anfangsdatum) -> {pflegebedarf: [betten, datum_anzahl, datum_summe]}
+    levels = {}
+    for pflegebedarf, anfangsdatum in rows:
+        entry = levels.setdefault(pflegebedarf or "", [0, 0, 0])
+        entry[0] += 1
+        day = _day(anfangsdatum)
+        if day is not None:
+            entry[1] += 1
+            entry[2] += day
+    return levels
+
+
+def _add(tx, table, key_column, key, columns=None, **deltas):
+    # portables "Upsert": Zeile sicher anlegen (columns = weitere Werte fürs
+    # Anlegen), dann relativ ändern
+    columns = {key_column: key, **(columns or {})}
+    tx.write(
+        f"INSERT IGNORE INTO {table} (" + ", ".join(f"`{c}`" for c in columns) + ") "
+        f"VALUES (" + ", ".join(["%s"] * len(columns)) + ")",
+        tuple(columns.values())
+    )
+    assignments = ", ".join(f"{column} = {column} + %s" for column in deltas)
+    tx.write(
+        f"UPDATE {table} SET {assignments} WHERE `{key_column}` = %s",
+        (*deltas.values(), key)
+    )
+
+
+# -------- inkrementell (tx = db.Transaction) --------
+
+def aufenthalt_added(tx, pflegebedarf, anfangsdatum, sign=1):
+    day = _day(anfangsdatum)
+    _add(
+        tx, "stat_pflegebedarf", "schluessel", level_key(pflegebedarf), {"pflegebedarf": pflegebedarf or ""},
+        betten=sign,
+        datum_anzahl=sign if day is not None else 0,
+        datum_summe=sign * (day or 0),
+    )
+
+
+def aufenthalt_removed(tx, pflegebedarf, anfangsdatum):
+    aufenthalt_added(tx, pflegebedarf, anfangsdatum, sign=-1)
+
+
+def aufenthalte_added(tx, rows):
+    """Wie aufenthalt_added für viele (pflegebedarf, anfangsdatum), ein Upsert pro Pflegebedarf."""
+    for level, (betten, datum_anzahl, datum_summe) in _levels(rows).items():
+        _add(
+            tx, "stat_pflegebedarf", "schluessel", level_key(level), {"pflegebedarf": level},
+            betten=betten, datum_anzahl=datum_anzahl, datum_summe=datum_summe,
+        )
+
+
+def behandelt_added(tx, aerztenummer, count=1):
+    _add(tx, "stat_arzt", "ärztenummer", aerztenummer, patienten=count)
+    _add(tx, "stat_zaehler", "name", "behandlungen", wert=count)
+
+
+def behandelt_removed(tx, aerztenummer, count=1):
+    behandelt_added(tx, aerztenummer, -count)
+
+
+def patient_added(tx, count=1):
+    _add(tx, "stat_zaehler", "name", "patienten", wert=count)
+
+
+def patient_removed(tx, count=1):
+    patient_added(tx, -count)
+
+
+def patients_removed(tx, patientennummern):
+    """Vor dem Löschen aufrufen: zieht die (kaskadierten) Behandlungen ab."""
+    rows = tx.read_in(
+        "SELECT `ärztenummer`, COUNT(*) AS n FROM behandelt "
+        "WHERE patientennummer IN {ids} GROUP BY `ärztenummer`",
+        patientennummern
+    )
+    totals = {}
+    for row in rows:
+        totals[row["ärztenummer"]] = totals.get(row["ärztenummer"], 0) + row["n"]
+    for aerztenummer, count in totals.items():
+        behandelt_removed(tx, aerztenummer, count)
+
+
+def aerzte_removed(tx, aerztenummern):
+    rows = tx.read_in("SELECT patienten FROM stat_arzt WHERE `ärztenummer` IN {ids}", aerztenummern)
+    tx.write_in("DELETE FROM stat_arzt WHERE `ärztenummer` IN {ids}", aerztenummern)
+    total = sum(row["patienten"] for row in rows)
+    if total:
+        _add(tx, "stat_zaehler", "name", "behandlungen", wert=-total)
+
+
+# -------- Vollständiger Neuaufbau --------
+
+def rebuild(cur):
+    """Berechnet alle stat_*-Tabellen neu (cur = normaler Tupel-Cursor)."""
+    for table in STAT_TABLES:
+        cur.execute(f"DELETE FROM {table}")
+
+    cur.execute("SELECT pflegebedarf, anfangsdatum FROM aktuellerAufenthalt")
+    levels = _levels(cur.fetchall())
+    if levels:
+        cur.executemany(
+            "INSERT INTO stat_pflegebedarf (schluessel, pflegebedarf, betten, datum_anzahl, datum_summe) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [(level_key(level), level, *values) for level, values in levels.items()]
+        )
+
+    cur.execute("""
+        INSERT INTO stat_arzt (`ärztenummer`, patienten)
+        SELECT `ärztenummer`, COUNT(*) FROM behandelt GROUP BY `ärztenummer`
+    """)
+    cur.execute("""
+        INSERT INTO stat_zaehler (name, wert)
+        SELECT 'patienten', COUNT(*) FROM patient
+        UNION ALL
+        SELECT 'behandlungen', COUNT(*) FROM behandelt
+    """)
+
+
+def rebuild_now():
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        rebuild(cur)
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    bump_table_version(*STAT_TABLES)
+
+
+# -------- Lesen (für /stats) --------
+
+def summarize(levels, doctors, counters, today=None):
+    """Rohzeilen der stat_*-Tabellen -> Werte fürs Dashboard."""
+    today = (today or datetime.date.today()).toordinal()
+    pflege = []
+    for row in levels:
+        if row["betten"] <= 0:
+            continue
+        avg_days = None
+        if row["datum_anzahl"] > 0:
+            avg_days = round(today - row["datum_summe"] / row["datum_anzahl"], 1)
+        pflege.append({"pflegebedarf": row["pflegebedarf"], "betten": row["betten"], "mittlere_dauer": avg_days})
+
+    return {
+        "betten_belegt": sum(p["betten"] for p in pflege),
+        "pflegebedarf": pflege,
+        "aerzte": [d for d in doctors if d["patienten"] > 0],
+        "zaehler": {row["name"]: row["wert"] for row in counters},
+    }
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else ""
+    if command == "rebuild":
+        rebuild_now()
+        print("Statistik neu berechnet.")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))